@@ -0,0 +1,70 @@
+import numpy as np
+from collections import namedtuple
+
+# ==== CONFIG ====
+MIN_AGE = 25  # youngest age the AI check passes on its own (MINIMUM_LEEFTIJD_AUTO_PASS)
+PASS_BOUND = 0.95  # stop with "pass" once P(age >= threshold) reaches this
+FAIL_BOUND = 0.05  # stop with "fail" once P(age >= threshold) drops to this
+MAX_FRAMES = 8  # frame budget before giving up as "undecided"
+POOLING = "mean"  # "mean": average distributions, "product": treat frames as independent
+# =================
+
+PASS = "pass"
+FAIL = "fail"
+UNDECIDED = "undecided"
+
+AgeDecision = namedtuple("AgeDecision", ["outcome", "p_over", "age", "frames"])
+
+
+# ---------------- Sequential Decision ----------------
+class SequentialAgeDecision:
+    """
+    Accumulates per-frame age distributions (softmax over the age bins) and
+    stops as soon as P(age >= threshold) is confidently above or below the
+    bounds, or the frame budget runs out.
+    """
+    def __init__(self, threshold, pass_bound=PASS_BOUND, fail_bound=FAIL_BOUND,
+                 max_frames=MAX_FRAMES, pooling=POOLING):
+        if pooling not in ("mean", "product"):
+            raise ValueError(f"Unknown pooling: {pooling}")
+        self.threshold = threshold
+        self.pass_bound = pass_bound
+        self.fail_bound = fail_bound
+        self.max_frames = max_frames
+        self.pooling = pooling
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self._sum = None  # summed probabilities ("mean") or log-probabilities ("product")
+
+    def distribution(self):
+        """Pooled distribution over the age bins seen so far."""
+        if self.pooling == "mean":
+            return self._sum / self.frames
+        dist = np.exp(self._sum - self._sum.max())
+        return dist / dist.sum()
+
+    def add(self, probs):
+        """
+        Add one frame's distribution (1-D, one entry per age bin).
+        Returns an AgeDecision once decided, otherwise None.
+        """
+        probs = np.asarray(probs, dtype=np.float64)
+        term = probs if self.pooling == "mean" else np.log(np.clip(probs, 1e-12, None))
+        self._sum = term if self._sum is None else self._sum + term
+        self.frames += 1
+
+        dist = self.distribution()
+        p_over = float(dist[int(np.ceil(self.threshold)):].sum())
+        if p_over >= self.pass_bound:
+            outcome = PASS
+        elif p_over <= self.fail_bound:
+            outcome = FAIL
+        elif self.frames >= self.max_frames:
+            outcome = UNDECIDED
+        else:
+            return None
+
+        age = float(np.dot(dist, np.arange(len(dist))))
+        return AgeDecision(outcome, p_over, age, self.frames)
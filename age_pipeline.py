@@ -0,0 +1,303 @@
+"""
+The age check without a GUI: frames in, typed results out. Detection,
+tracking, the quality gate, cropping and prediction run exactly as in the
+kiosk, so batch jobs, servers and tests use the same engine as KivyCamera.
+
+    pipeline = AgeCheckPipeline(min_age=25)
+    for result in pipeline.run("recording.mp4"):
+        if result.status == DECIDED:
+            print(result.age, result.outcome)
+
+    async for result in pipeline.stream(0):  # camera index
+        ...
+"""
+import asyncio
+import glob
+import os
+import threading
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+from age_decision import FAIL, MIN_AGE, PASS, UNDECIDED, SequentialAgeDecision
+from age_server import RemoteDetector, connect
+from camera_capture import CaptureService, Frame
+from face_tracking import FaceTracker
+from frame_quality import gate_faces, nearby_faces, second_customer
+from metrics import DETECTOR_RUNS, FRAMES_REJECTED, FRAMES_SEEN, STAGE_SECONDS
+from model import new_face_detector, new_multi_frame_estimator, predict_faces
+
+# ==== CONFIG ====
+# "single": first usable frame decides, "multi": batched estimate,
+# "sequential": stop as soon as the accumulated age distribution is decisive
+AGE_MODE = "sequential"
+# the primary face (largest and most central, see rank_detections) decides;
+# with a second customer as close for this many frames, staff takes over
+CROWDED_FRAMES = 5
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+STREAM_BUFFER = 1  # results the async stream computes ahead of its consumer
+# =================
+
+# status of a frame in AgeCheckResult
+WARM_UP = "warm_up"  # before the pipeline's warm-up time
+NO_FACE = "no_face"
+LOW_QUALITY = "quality"  # the primary face failed the quality gate
+CROWDED = "crowded"  # a second face about as close as the primary one
+PENDING = "pending"  # scored, not decisive yet
+DECIDED = "decided"
+
+# faces are the FaceAge list of the frame (empty unless scored); outcome
+# ("pass", "fail" or "undecided"), age and p_over, the confidence
+# P(age >= min_age), are only set when DECIDED, the latter two only when
+# the mode has them and a face was scored
+AgeCheckResult = namedtuple("AgeCheckResult", ["index", "timestamp", "status", "faces", "age", "outcome", "p_over"],
+                            defaults=(None,))
+
+
+# ---------------- Frame Sources ----------------
+def frame_source(source):
+    """
+    Frames from a camera index or CaptureService (always the newest frame,
+    older ones are dropped), a video file or an image folder (every frame,
+    in order) or any iterable of BGR arrays or Frames.
+    """
+    if isinstance(source, CaptureService):
+        return _capture_frames(source)
+    if isinstance(source, int):
+        return _camera_frames(source)
+    if isinstance(source, str):
+        return _image_frames(source) if os.path.isdir(source) else _video_frames(source)
+    return _array_frames(source)
+
+def _capture_frames(capture):
+    index = -1
+    while capture.isOpened():
+        frame = capture.wait_newer(index, timeout=0.5)
+        if frame is not None:
+            index = frame.index
+            if capture.settled(frame):
+                yield frame
+
+def _camera_frames(camera_index):
+    capture = CaptureService(cv2.VideoCapture(camera_index)).start()
+    try:
+        yield from _capture_frames(capture)
+    finally:
+        capture.release()
+
+def _video_frames(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open {path}")
+    try:
+        index = 0
+        while True:
+            ret, image = capture.read()
+            if not ret:
+                return
+            # timestamps follow the recording, not the wall clock
+            yield Frame(image, capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, index)
+            index += 1
+    finally:
+        capture.release()
+
+def _image_frames(folder):
+    files = sorted(f for f in glob.glob(os.path.join(folder, "*")) if f.lower().endswith(IMAGE_EXTENSIONS))
+    for index, file in enumerate(files):
+        image = cv2.imread(file)
+        if image is not None:
+            yield Frame(image, time.monotonic(), index)
+
+def _array_frames(frames):
+    for index, frame in enumerate(frames):
+        yield frame if isinstance(frame, Frame) else Frame(np.asarray(frame), time.monotonic(), index)
+
+
+# ---------------- Pipeline ----------------
+class AgeCheckPipeline:
+    """
+    Detection -> tracking -> quality gate -> crop -> age prediction for a
+    stream of Frames. process() handles one frame; run() and stream() drive
+    a whole source. Models are built on the first frame, on the thread that
+    processes it. Not thread-safe: one pipeline per stream.
+    - warm_up: seconds after start_time during which frames are skipped;
+      start_time is on the clock of the frame timestamps and defaults to the
+      first frame's, so recordings and cameras behave alike
+    - flip: analyse the image rotated by 180 degrees, as mounted at the kiosk
+    - use_server: detect and score on the shared age server when one answers
+    """
+    def __init__(self, min_age=MIN_AGE, mode=AGE_MODE,
+                 warm_up=0.0, start_time=None, flip=True, use_server=True):
+        if mode not in ("single", "multi", "sequential"):
+            raise ValueError(f"Unknown age mode: {mode}")
+        self.min_age = min_age
+        self.mode = mode
+        self.warm_up = warm_up
+        self.start_time = start_time
+        self.flip = flip
+        self.use_server = use_server
+        self.tracker = None
+        self.remote = None  # AgeClient while a shared age server is in use
+        self.multi_frame = None
+        self.crowded_frames = 0
+
+    def reset(self):
+        """Forget all faces and evidence, e.g. for the next customer."""
+        # the detector and the age server connection are kept
+        if self.tracker is not None:
+            self.tracker.reset()
+        self.multi_frame = None
+        self.crowded_frames = 0
+
+    # ---------------- Streams ----------------
+    def run(self, source):
+        """
+        Generator of one AgeCheckResult per frame of `source` (see
+        frame_source). Frames are only read as fast as results are consumed;
+        after every decision the pipeline resets for the next person.
+        """
+        for frame in frame_source(source):
+            result = self.process(frame)
+            if result.status == DECIDED:
+                self.reset()
+            yield result
+
+    async def stream(self, source, buffer=STREAM_BUFFER):
+        """
+        run() as an async iterator. Frames are processed on a worker thread
+        at most `buffer` results ahead of the consumer, so a slow consumer
+        slows the pipeline down instead of piling up results.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(buffer)
+        done = object()
+        stopped = threading.Event()
+
+        def produce():
+            results = self.run(source)
+            try:
+                for result in results:
+                    # blocks this thread while the queue is full
+                    asyncio.run_coroutine_threadsafe(queue.put(result), loop).result()
+                    if stopped.is_set():
+                        return
+            finally:
+                results.close()  # releases a camera opened by index
+                if not stopped.is_set():
+                    asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                result = await queue.get()
+                if result is done:
+                    break
+                yield result
+        finally:
+            stopped.set()
+            while not queue.empty():  # unblock a waiting put
+                queue.get_nowait()
+            await producer  # re-raises errors from the pipeline
+
+    # ---------------- One Frame ----------------
+    def process(self, captured):
+        """Run one Frame through the pipeline."""
+        if self.warm_up > 0:
+            if self.start_time is None:
+                self.start_time = captured.timestamp
+            if captured.timestamp - self.start_time < self.warm_up:
+                return self._result(captured, WARM_UP)
+        FRAMES_SEEN.inc()
+        # the detectors have always seen the flipped camera image
+        if self.flip:
+            with STAGE_SECONDS.labels("flip").time():
+                frame = cv2.flip(captured.image, -1)
+        else:
+            frame = captured.image
+
+        # the tracker follows faces between (periodic) detector passes; its
+        # boxes travel on into cropping and prediction. It is built, and the
+        # age server checked, only once: on the first frame, so a KivyCamera
+        # never waits for the health check on the UI thread
+        if self.tracker is None:
+            self.tracker = self._new_tracker()
+        detector_runs = self.tracker.detector_runs
+        with STAGE_SECONDS.labels("track").time():
+            self.tracker.update(frame)
+        DETECTOR_RUNS.inc(self.tracker.detector_runs - detector_runs)
+        detections = self.tracker.detections()
+        if len(detections) == 0:
+            FRAMES_REJECTED.labels(NO_FACE).inc()
+            return self._result(captured, NO_FACE)
+        # two customers about equally close: not for the AI to pick one
+        if second_customer(nearby_faces(detections, frame.shape)):
+            self.crowded_frames += 1
+            if self.crowded_frames < CROWDED_FRAMES:
+                return self._result(captured, CROWDED)
+            print("Several customers at the lane, handing over to staff")
+            return self._result(captured, DECIDED, outcome=UNDECIDED)
+        self.crowded_frames = 0
+        # sharpness, exposure, size and pose on the primary face ROI only,
+        # before the expensive age model
+        with STAGE_SECONDS.labels("quality").time():
+            detections = gate_faces(frame, detections)
+        if len(detections) == 0:
+            FRAMES_REJECTED.labels(LOW_QUALITY).inc()
+            return self._result(captured, LOW_QUALITY)
+
+        if self.mode == "multi":
+            if self.multi_frame is None:
+                self.multi_frame = new_multi_frame_estimator(min_age=self.min_age)
+            estimate = self.multi_frame.add(frame, captured.timestamp, detections)
+            if estimate is None:
+                return self._result(captured, PENDING)
+            print(f"Age over {estimate.count} frames: {estimate.age:.1f} (spread {estimate.spread:.1f})")
+            return self._result(captured, DECIDED, age=estimate.age, outcome=self._compare(estimate.age))
+
+        # only the primary face passed the gate, so only it is scored
+        faces = self.score_faces(frame, detections)
+        face = faces[0]
+        if self.mode == "single":
+            p_over = float(face.probs[self.min_age:].sum())
+            return self._result(captured, DECIDED, faces, face.age, self._compare(face.age), p_over)
+
+        # age evidence is accumulated per person, keyed by track
+        track = self.tracker.track_for(face.box)
+        self.add_evidence(track, face)
+        decision = track.state.get("decision")
+        if decision is None:
+            return self._result(captured, PENDING, faces)
+        print(f"Decision for face {track.id} after {decision.frames} frames: "
+              f"{decision.outcome} (P(age >= {self.min_age}) = {decision.p_over:.2f})")
+        return self._result(captured, DECIDED, faces, decision.age, decision.outcome, decision.p_over)
+
+    def _new_tracker(self):
+        self.remote = connect() if self.use_server else None
+        if self.remote is not None:
+            return FaceTracker(RemoteDetector(self.remote, new_face_detector))
+        return FaceTracker(new_face_detector())
+
+    def _compare(self, age):
+        return PASS if age >= self.min_age else FAIL
+
+    def _result(self, captured, status, faces=(), age=None, outcome=None, p_over=None):
+        return AgeCheckResult(captured.index, captured.timestamp, status, list(faces), age, outcome, p_over)
+
+    def score_faces(self, frame, detections):
+        """predict_faces on the age server, or in-process once it is unavailable."""
+        if self.remote is not None:
+            try:
+                return self.remote.predict_faces(frame, detections, self.min_age)
+            except ConnectionError as e:
+                print("Predicting in-process:", e)
+                self.remote = None
+        return predict_faces(frame, detections, self.min_age)
+
+    def add_evidence(self, track, face):
+        """Feed one frame's scored face to the track's own sequential decision."""
+        if "decision" in track.state:
+            return
+        engine = track.state.setdefault("engine", SequentialAgeDecision(self.min_age))
+        decision = engine.add(face.probs)
+        if decision is not None:
+            track.state["decision"] = decision
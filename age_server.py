@@ -0,0 +1,370 @@
+"""
+Local age-inference server, so all checkout lanes of a store share one
+copy of the age model and face detector instead of each loading their
+own. Lanes talk to it over localhost HTTP; age requests that arrive
+within BATCH_WINDOW of each other are scored in a single forward pass.
+
+    python age_server.py --port 8765 --backend auto
+    AGE_SERVER_URL=http://127.0.0.1:8765 python main.py
+
+With AGE_SERVER_URL set, a lane detects and scores faces through the
+server and falls back to in-process inference when it cannot be reached.
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import numpy as np
+from prometheus_client import Histogram
+from face_detection import DETECT_SCALE, DETECTOR, Detection, ScaledDetector, make_detector, rank_detections
+from metrics import STAGE_SECONDS, metrics
+from model import FaceAge, FacePreprocessor, ModelRegistry, age_distributions, expected_ages, face_crops, model_registry
+
+# ==== CONFIG ====
+SERVER_HOST = "127.0.0.1"  # never listen beyond this machine
+SERVER_PORT = 8765
+SERVER_URL = os.environ.get("AGE_SERVER_URL", "")  # empty: lanes run inference in-process
+BATCH_WINDOW = 0.005  # seconds the first waiting request holds the batch open
+MAX_BATCH = 16  # faces per forward pass
+REQUEST_TIMEOUT = 2.0  # seconds before a lane gives up on the server
+# =================
+
+BATCH_SIZE = Histogram(
+    "agecheck_server_batch_faces", "Faces per forward pass on the age server.",
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+# ---------------- Wire Format ----------------
+# images travel as raw uint8 bytes with their shape in X-Shape; localhost
+# bandwidth is cheaper than encoding, and keeps the pixels exact
+def encode_images(images):
+    shape = images.shape
+    return images.tobytes(), ",".join(str(v) for v in shape)
+
+def decode_images(body, shape_header):
+    shape = tuple(int(v) for v in shape_header.split(","))
+    return np.frombuffer(body, dtype=np.uint8).reshape(shape)
+
+
+# ---------------- Dynamic Batching ----------------
+class DynamicBatcher:
+    """
+    Collects face crops from concurrent requests and scores them together.
+    The first waiting request opens a window of `window` seconds; the batch
+    runs when it closes or as soon as `max_batch` faces are waiting.
+    - run_batch: callable([N, size, size, 3] crops, min_age) -> [N, num_ages]
+      array; only requests for the same min_age share a batch
+    """
+    def __init__(self, run_batch, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.faces = 0
+        self._pending = []  # (crops, min_age, future)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="age-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, crops, min_age=None):
+        """Future resolving to the age distributions of these crops."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batcher is closed.")
+            self._pending.append((crops, min_age, future))
+            self._cond.notify()
+        return future
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _waiting(self):
+        return sum(len(crops) for crops, _, _ in self._pending)
+
+    def _take(self):
+        """Wait for a batch worth of requests; None once closed."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self._closed)
+            deadline = time.monotonic() + self.window
+            while not self._closed and self._waiting() < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._closed:
+                for _, _, future in self._pending:
+                    future.set_exception(RuntimeError("Batcher is closed."))
+                self._pending = []
+                return None
+
+            # whole requests for the first one's min_age only; the first
+            # one goes even when it is larger
+            min_age = self._pending[0][1]
+            taken, waiting, count = [], [], 0
+            for crops, age, future in self._pending:
+                if age == min_age and (not taken or count + len(crops) <= self.max_batch):
+                    taken.append((crops, future))
+                    count += len(crops)
+                else:
+                    waiting.append((crops, age, future))
+            self._pending = waiting
+            return taken, min_age
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            taken, min_age = batch
+            crops = np.concatenate([c for c, _ in taken])
+            try:
+                probs = self.run_batch(crops, min_age)
+            except Exception as e:
+                for _, future in taken:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.faces += len(crops)
+            BATCH_SIZE.observe(len(crops))
+            start = 0
+            for c, future in taken:
+                future.set_result(probs[start:start + len(c)])
+                start += len(c)
+
+
+# ---------------- Server ----------------
+class AgeServer:
+    """
+    Serves the shared models on localhost:
+    - POST /predict: face crops (see face_crops), with an optional
+      X-Min-Age for the cascade -> {"probs": [[...], ...]}
+    - POST /detect: a frame, with an optional X-Scale -> {"detections": [[x1, y1, x2, y2, score], ...]}
+    - GET /health
+    """
+    def __init__(self, registry=None, host=SERVER_HOST, port=SERVER_PORT,
+                 window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.registry = (registry or model_registry).load()
+        # detection is not batched; YOLO is not thread-safe, so one at a time
+        self.detector = make_detector(DETECTOR, self.registry.face_preparer.yolo, scale=1.0)
+        self._detect_lock = threading.Lock()
+        # the server's own buffers; the registry's belong to in-process predict_faces
+        self.preprocessor = FacePreprocessor(self.registry.device)
+        self.batcher = DynamicBatcher(self.score_crops, window, max_batch)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+
+    def score_crops(self, crops, min_age=None):
+        """Runs on the batcher thread, the only user of self.preprocessor."""
+        return age_distributions(self.registry.model, self.preprocessor.from_crops(crops), min_age)
+
+    def detect(self, frame, scale):
+        with self._detect_lock, STAGE_SECONDS.labels("detect").time():
+            return self.detector.detect(frame, scale)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive: one connection per lane
+
+            def do_GET(self):
+                if self.path != "/health":
+                    return self.send_error(404)
+                self._reply({"status": "ok", "backend": server.registry.backend})
+
+            def do_POST(self):
+                try:
+                    body = self.rfile.read(int(self.headers["Content-Length"]))
+                    images = decode_images(body, self.headers["X-Shape"])
+                    min_age = self.headers.get("X-Min-Age")
+                    min_age = None if min_age is None else int(min_age)
+                except (AttributeError, TypeError, ValueError) as e:  # missing or malformed headers or body
+                    return self.send_error(400, str(e))
+                try:
+                    if self.path == "/predict":
+                        probs = server.batcher.submit(images, min_age).result()
+                        return self._reply({"probs": probs.tolist()})
+                    if self.path == "/detect":
+                        detections = server.detect(images, float(self.headers.get("X-Scale", 1.0)))
+                        return self._reply({"detections": [list(d.box) + [d.score] for d in detections]})
+                except Exception as e:
+                    print("Age server error:", e)
+                    return self.send_error(500, str(e))
+                self.send_error(404)
+
+            def _reply(self, data):
+                payload = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve from a daemon thread; returns self."""
+        threading.Thread(target=self._httpd.serve_forever, name="age-server", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self.batcher.close()
+
+
+# ---------------- Client ----------------
+class AgeClient:
+    """
+    Lane-side connection to an AgeServer, with the same results as the
+    in-process predict_faces. Raises OSError when the server is gone.
+    Not thread-safe: give every thread its own client.
+    """
+    def __init__(self, url=SERVER_URL, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port
+        self.timeout = timeout
+        self._conn = None
+
+    def _request(self, method, path, images=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if images is not None:
+            body, headers["X-Shape"] = encode_images(np.ascontiguousarray(images))
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self._conn.request(method, path, body=body, headers=headers)
+            response = self._conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise ConnectionError(f"Age server unavailable: {e}") from e
+        if response.status != 200:
+            raise ConnectionError(f"Age server error {response.status}: {payload[:200]!r}")
+        return json.loads(payload)
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def distributions(self, crops, min_age=None):
+        """Age-bin probabilities for face crops, as an [N, num_ages] array."""
+        headers = {} if min_age is None else {"X-Min-Age": str(min_age)}
+        return np.asarray(self._request("POST", "/predict", crops, headers)["probs"], dtype=np.float32)
+
+    def detect(self, frame, scale=1.0):
+        data = self._request("POST", "/detect", frame, {"X-Scale": str(scale)})
+        return [Detection(tuple(d[:4]), d[4]) for d in data["detections"]]
+
+    def predict_faces(self, frame, detections, min_age=None):
+        """Remote predict_faces: every ranked face scored, best-ranked first."""
+        if len(detections) == 0:
+            raise ValueError("No face detected in the frame.")
+        faces = rank_detections(detections, frame.shape)
+        probs = self.distributions(face_crops(frame, [face.box for face in faces]), min_age)
+        return [
+            FaceAge(face.box, face.score, float(age), p)
+            for face, age, p in zip(faces, expected_ages(probs), probs)
+        ]
+
+class RemoteDetector:
+    """
+    Face detector that runs on the age server, on frames downscaled on the
+    lane, and switches for good to a local one (built by `fallback`) once
+    the server fails.
+    """
+    def __init__(self, client, fallback, scale=DETECT_SCALE):
+        self.remote = ScaledDetector(client, scale) if scale < 1.0 else client
+        self.fallback = fallback
+        self.local = None
+
+    def detect(self, frame):
+        if self.local is None:
+            try:
+                return self.remote.detect(frame)
+            except ConnectionError as e:
+                print("Detecting in-process:", e)
+                self.local = self.fallback()
+        return self.local.detect(frame)
+
+def connect(url=SERVER_URL):
+    """An AgeClient when a server is configured and answering, else None."""
+    if not url:
+        return None
+    client = AgeClient(url)
+    try:
+        print("Age server:", client.health())
+    except ConnectionError as e:
+        print(e)
+        return None
+    return client
+
+def load_models_async(on_ready=None, on_error=None):
+    """
+    Check for the age server on a background thread and fall back to
+    model_registry.load_async when there is none; callbacks run on a
+    background thread. With a server the local models still load in the
+    background afterwards, so a lane that loses the server mid-check falls
+    back to warm models instead of loading them on the inference thread.
+    """
+    def run():
+        client = connect()
+        if client is None:
+            model_registry.load_async(on_ready, on_error)
+            return
+        client.close()
+        if on_ready:
+            on_ready()
+        model_registry.load_async()
+
+    thread = threading.Thread(target=run, name="age-server-check", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--backend", default="auto", help="eager, torchscript, onnx, int8 or auto")
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW, help="batching window in seconds")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+
+    metrics.start_export()
+    server = AgeServer(ModelRegistry(backend=args.backend), port=args.port,
+                       window=args.window, max_batch=args.max_batch)
+    print(f"Age server on http://{SERVER_HOST}:{server.port} (window {args.window * 1000:.0f} ms, "
+          f"max batch {args.max_batch})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.batcher.close()
+        metrics.stop_export()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Audit trail of age-check decisions: AI outcomes, staff overrides and
+cancels. record() only puts the event on a bounded in-memory queue, so it
+is safe to call from Kivy callbacks; a background thread writes batches to
+a SQLite database in WAL mode, or to an append-only JSON-lines file when
+the path ends in .jsonl. Events never contain images.
+"""
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from prometheus_client import Counter
+
+# ==== CONFIG ====
+AUDIT_PATH = os.environ.get("AGE_AUDIT_PATH", "./audit.db")  # .db/.sqlite, or .jsonl for a plain file
+LANE_ID = os.environ.get("AGE_LANE", socket.gethostname())
+QUEUE_LIMIT = 10000  # events held in memory; beyond this new events are dropped and counted
+BATCH_SIZE = 200  # events per write
+FLUSH_INTERVAL = 2.0  # seconds an event may wait before its batch is written
+# =================
+
+AUDIT_DROPPED = Counter(
+    "agecheck_audit_dropped_total", "Audit events dropped because the writer fell behind.")
+
+# kind is "ai", "staff" or "cancel"; age, p_over (P(age >= threshold)) and
+# latency (seconds since the check started) are None when not applicable
+AuditEvent = namedtuple("AuditEvent", ["timestamp", "lane", "kind", "outcome", "age", "p_over", "latency"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS age_checks (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    lane TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    age REAL,
+    p_over REAL,
+    latency REAL
+)
+"""
+
+
+# ---------------- Writers ----------------
+class SqliteWriter:
+    def __init__(self, path):
+        # opened on the writer thread, the only one that touches it
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, cheap per batch
+        self.db.execute(SCHEMA)
+
+    def write(self, events):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO age_checks (timestamp, lane, kind, outcome, age, p_over, latency) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+
+    def close(self):
+        self.db.close()
+
+class JsonLinesWriter:
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, events):
+        self.file.write("".join(json.dumps(event._asdict()) + "\n" for event in events))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+# ---------------- Audit Log ----------------
+class AuditLog:
+    """Non-blocking, batched audit log; start() once, close() on shutdown to flush."""
+    def __init__(self, path=AUDIT_PATH, lane=LANE_ID, limit=QUEUE_LIMIT,
+                 batch_size=BATCH_SIZE, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.lane = lane
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(limit)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, kind, outcome, age=None, p_over=None, latency=None):
+        """Queue one event; never blocks the caller."""
+        event = AuditEvent(time.time(), self.lane, kind, outcome, age, p_over, latency)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            AUDIT_DROPPED.inc()
+
+    def close(self, timeout=5.0):
+        """Write everything still queued and stop the writer."""
+        self._stopped.set()
+        try:
+            self._queue.put_nowait(None)  # wakes the writer instead of waiting out the interval
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next_batch(self):
+        """Up to batch_size events, waiting at most `interval` after the first."""
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size and not self._stopped.is_set():
+            # the first event may wait a full interval, later ones until its deadline
+            timeout = self.interval if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                event = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if event is None:
+                break
+            if not batch:
+                deadline = time.monotonic() + self.interval
+            batch.append(event)
+        return batch
+
+    def _run(self):
+        writer = JsonLinesWriter(self.path) if self.path.endswith(".jsonl") else SqliteWriter(self.path)
+        try:
+            while True:
+                stopping = self._stopped.is_set()
+                batch = self._next_batch() if not stopping else self._drain()
+                if batch:
+                    try:
+                        writer.write(batch)
+                    except Exception as e:
+                        print("Audit log error:", e)
+                if stopping and self._queue.empty():
+                    return
+        finally:
+            writer.close()
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is not None:
+                batch.append(event)
+        return batch
+
+
+audit_log = AuditLog()
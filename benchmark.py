@@ -0,0 +1,213 @@
+"""
+Headless latency benchmark of the age-check pipeline. Replays a video file
+or a folder of images through the same stages as KivyCamera and
+predict_age_from_frame, without a webcam or a Kivy window.
+
+    python benchmark.py recording.mp4 --out bench.json
+    python benchmark.py ./frames --backend onnx --baseline bench.json
+
+Reports p50/p95/p99 latency per stage, time-to-decision of the sequential
+age check, frames/sec and, with the cascade on, how many faces escalated
+to VGG16, and writes everything as JSON. With --baseline
+it exits non-zero when a stage's p95 got slower than --max-regression.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import cv2
+import numpy as np
+import torch
+from age_decision import MIN_AGE, SequentialAgeDecision
+from face_detection import HaarDetector, ScaledDetector
+from frame_quality import THRESHOLD, gate_faces, is_image_sharp
+from model import PREPROCESS, ModelRegistry, age_distributions, crop_and_resize
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# ---------------- Frame Sources ----------------
+def read_frames(path, timer):
+    """Yield BGR frames from a video file or an image folder, timing each read as "capture"."""
+    if os.path.isdir(path):
+        files = sorted(f for f in glob.glob(os.path.join(path, "*")) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for file in files:
+            with timer.stage("capture"):
+                frame = cv2.imread(file)
+            if frame is not None:
+                yield frame
+        return
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Cannot open {path}")
+    try:
+        while True:
+            with timer.stage("capture"):
+                ret, frame = capture.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        capture.release()
+
+
+# ---------------- Timing ----------------
+class StageTimer:
+    """Collects wall-clock durations (ms) per named stage."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.last = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.last = (time.perf_counter() - start) * 1000
+        self.samples[name].append(self.last)
+
+def summarize(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+# ---------------- Benchmark ----------------
+def run(path, registry, max_frames=None):
+    """Push every frame through all stages; returns the results dict."""
+    timer = StageTimer()
+    haar = HaarDetector()
+    scaled_haar = ScaledDetector(HaarDetector())
+    decision = SequentialAgeDecision(MIN_AGE)
+    decisions, time_to_decision = [], []
+    elapsed_since_decision = 0.0  # ms of pipeline work since the last decision
+    frames = 0
+
+    wall_start = time.perf_counter()
+    for frame in read_frames(path, timer):
+        frames += 1
+        elapsed_since_decision += timer.last  # capture
+
+        with timer.stage("flip"):
+            frame = cv2.flip(frame, -1)
+        elapsed_since_decision += timer.last
+        # full-frame sharpness, timed for comparison with the ROI quality gate
+        with timer.stage("sharpness"):
+            is_image_sharp(frame, THRESHOLD)
+        with timer.stage("haar_detect"):
+            haar.detect(frame)
+        # multi-resolution variant, timed for comparison
+        with timer.stage("haar_detect_scaled"):
+            scaled_haar.detect(frame)
+        with timer.stage("yolo_detect"):
+            detections = registry.face_preparer.detect(frame)
+        elapsed_since_decision += timer.last
+
+        if detections:
+            with timer.stage("quality_gate"):
+                usable = gate_faces(frame, detections)
+            elapsed_since_decision += timer.last
+            box = detections[0].box
+            # legacy PIL path, timed for comparison with the fused one
+            with timer.stage("crop_and_resize"):
+                face = crop_and_resize(frame, box)
+            with timer.stage("preprocess_pil"):
+                PREPROCESS(face).unsqueeze(0).to(registry.device)
+
+            with timer.stage("preprocess"):
+                batch = registry.preprocessor(frame, [box])
+            elapsed_since_decision += timer.last
+            with timer.stage("forward"):
+                probs = age_distributions(registry.model, batch, MIN_AGE)[0]
+            elapsed_since_decision += timer.last
+
+            # same gate as KivyCamera: every face at the lane passes the quality gate
+            if usable:
+                result = decision.add(probs)
+                if result is not None:
+                    decisions.append(result._asdict())
+                    time_to_decision.append(elapsed_since_decision)
+                    elapsed_since_decision = 0.0
+                    decision.reset()
+
+        if max_frames and frames >= max_frames:
+            break
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "source": path,
+        "backend": registry.backend,
+        "device": str(registry.device),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "frames": frames,
+        "frames_per_sec": frames / wall if wall > 0 else 0.0,
+        "stages": {name: summarize(samples) for name, samples in timer.samples.items()},
+        "time_to_decision": summarize(time_to_decision),
+        "decisions": decisions,
+        "escalation_rate": getattr(registry.model, "escalation_rate", None),
+    }
+
+def regressions(results, baseline, max_regression):
+    """Stages whose p95 grew by more than max_regression (a fraction) over the baseline."""
+    slower = []
+    for name, stats in results["stages"].items():
+        old = baseline.get("stages", {}).get(name, {}).get("p95_ms")
+        if old and stats.get("p95_ms", 0) > old * (1 + max_regression):
+            slower.append((name, old, stats["p95_ms"]))
+    return slower
+
+def print_report(results):
+    print(f"{results['frames']} frames, {results['frames_per_sec']:.1f} frames/sec, backend {results['backend']}")
+    if results["escalation_rate"] is not None:
+        print(f"cascade: {results['escalation_rate']:.1%} of faces escalated to VGG16")
+    print(f"{'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(results["stages"].items()) + [("time_to_decision", results["time_to_decision"])]
+    for name, stats in rows:
+        if stats["count"]:
+            print(f"{name:<18}{stats['count']:>7}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="video file or folder of images")
+    parser.add_argument("--backend", default="auto", help="eager, torchscript, onnx, int8 or auto")
+    parser.add_argument("--cascade", default="off", help="on, off or auto: cheap model first, VGG16 on close calls")
+    parser.add_argument("--max-frames", type=int, help="stop after this many frames")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 slowdown, e.g. 0.2 = 20%%")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(backend=args.backend, cascade=args.cascade).load()
+    results = run(args.source, registry, args.max_frames)
+    print_report(results)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.max_regression)
+        for name, old, new in slower:
+            print(f"REGRESSION {name}: p95 {old:.2f} ms -> {new:.2f} ms")
+        if slower:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
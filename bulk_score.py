@@ -0,0 +1,281 @@
+"""
+Re-score a labelled face dataset with the age model, e.g. after swapping
+epoch_008.pth. Worker processes decode and detect; the main process
+batches the face crops into large forward passes and appends results as it
+goes, so an interrupted run resumes where it stopped.
+
+    python bulk_score.py ./UTKFace scores.csv --filename-age --detector none
+    python bulk_score.py ./frames scores.parquet --labels labels.csv --workers 8
+    python bulk_score.py ./clips scores.csv --every 10
+
+Labels come from a CSV with "path" (relative to the input folder) and
+"age" columns, or with --filename-age from a leading number in the file
+name (UTKFace style, "23_1_0_2017....jpg"). Prints MAE and throughput at
+the end. Parquet output is a folder of part files, one per flush. Videos
+are split into chunks of VIDEO_CHUNK scored frames, so a long clip never
+sits in memory as a whole; sources that raised an error are retried on
+the next run.
+"""
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import re
+import time
+import cv2
+import numpy as np
+import torch
+from age_decision import MIN_AGE
+from face_detection import make_detector, rank_detections
+from model import (
+    AGE_MODEL_PATH, YOLO_MODEL_PATH, FacePreprocessor, age_distributions, expected_ages, face_crops,
+    load_age_backend, resolve_backend,
+)
+
+# ==== CONFIG ====
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+BATCH_SIZE = 64  # faces per forward pass
+FLUSH_FACES = 512  # faces scored between writes to the output
+VIDEO_CHUNK = 32  # scored video frames per worker task
+FIELDS = ["source", "frame", "status", "label", "age", "p_over", "x1", "y1", "x2", "y2"]
+# =================
+
+
+# ---------------- Decode & Detect Workers ----------------
+_detector = None
+
+def init_worker(detector_kind, yolo_model_path):
+    """Runs once per worker process; every worker gets its own detector."""
+    global _detector
+    cv2.setNumThreads(1)  # parallelism comes from the processes
+    if detector_kind == "none":
+        _detector = None
+    elif detector_kind == "haar":
+        _detector = make_detector("haar", scale=1.0)
+    else:
+        from ultralytics import YOLO  # slow import, only paid when a YOLO detector is used
+        _detector = make_detector(detector_kind, YOLO(yolo_model_path, task="detect"), scale=1.0)
+
+def read_source(path, every, start=0, stop=None):
+    """
+    (frame_number, BGR image) for an image file, or every `every`-th frame
+    of a video between frame numbers start and stop.
+    """
+    if not is_video(path):
+        image = cv2.imread(path)
+        if image is not None:
+            yield 0, image
+        return
+    capture = cv2.VideoCapture(path)
+    try:
+        if start:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        number = start
+        while stop is None or number < stop:
+            ret, image = capture.read()
+            if not ret:
+                return
+            if number % every == 0:
+                yield number, image
+            number += 1
+    finally:
+        capture.release()
+
+def decode_and_detect(task):
+    """
+    One image or video chunk -> (path, label, [(frame, status, box, crop)]),
+    crop being the face_crops uint8 crop of the best-ranked face or None.
+    """
+    path, label, every, start, stop = task
+    found = []
+    try:
+        for number, image in read_source(path, every, start, stop):
+            if _detector is None:
+                h, w = image.shape[:2]
+                box = (0.0, 0.0, float(w), float(h))  # already a face crop
+            else:
+                detections = rank_detections(_detector.detect(image), image.shape)
+                if not detections:
+                    found.append((number, "no_face", None, None))
+                    continue
+                box = detections[0].box
+            found.append((number, "ok", box, face_crops(image, [box])[0]))
+    except Exception as e:
+        return path, label, [(start, f"error: {e}", None, None)]
+    if not found and start == 0:  # later chunks may just lie past the end of the video
+        found.append((0, "unreadable", None, None))
+    return path, label, found
+
+
+# ---------------- Inputs & Labels ----------------
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+def source_tasks(path, label, every):
+    """(path, label, every, start, stop) tasks: the whole image, or video chunks."""
+    if not is_video(path):
+        return [(path, label, every, 0, None)]
+    capture = cv2.VideoCapture(path)
+    frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    if frames <= 0:  # length unknown, read it in one go
+        return [(path, label, every, 0, None)]
+    step = VIDEO_CHUNK * every
+    return [(path, label, every, start, start + step) for start in range(0, frames, step)]
+
+def list_sources(folder):
+    extensions = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+    return sorted(
+        f for f in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+        if f.lower().endswith(extensions)
+    )
+
+def load_labels(labels_path, folder):
+    with open(labels_path, newline="") as f:
+        return {os.path.normpath(os.path.join(folder, row["path"])): float(row["age"]) for row in csv.DictReader(f)}
+
+def filename_age(path):
+    match = re.match(r"(\d+)", os.path.basename(path))
+    return float(match.group(1)) if match else None
+
+
+# ---------------- Output ----------------
+class ResultWriter:
+    """Appends result rows to a CSV file or a folder of Parquet parts; knows what is already done."""
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.rows = self._existing_rows()
+        self._parts = len(glob.glob(os.path.join(path, "part-*.parquet"))) if self.parquet else 0
+
+    def _existing_rows(self):
+        if self.parquet:
+            if not glob.glob(os.path.join(self.path, "part-*.parquet")):
+                return []
+            import polars as pl
+            return pl.read_parquet(os.path.join(self.path, "part-*.parquet")).to_dicts()
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, newline="") as f:
+            return list(csv.DictReader(f))
+
+    def done(self):
+        """(source, first frame) of every written task; errors are retried."""
+        return {(row["source"], int(row["frame"])) for row in self.rows
+                if not str(row["status"]).startswith("error")}
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.parquet:
+            import polars as pl  # optional, only needed for Parquet output
+            os.makedirs(self.path, exist_ok=True)
+            self._parts += 1
+            part = os.path.join(self.path, f"part-{self._parts:05d}.parquet")
+            pl.DataFrame(rows, infer_schema_length=None).select(FIELDS).write_parquet(part)
+        else:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", newline="") as f:
+                writer = csv.DictWriter(f, FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerows(rows)
+        self.rows.extend(rows)
+
+
+# ---------------- Scoring ----------------
+def score(pending, age_model, preprocessor, batch_size, min_age):
+    """Rows for every (path, label, found) in pending, all crops in batch_size forwards."""
+    crops = [crop for _, _, found in pending for _, _, _, crop in found if crop is not None]
+    ages, p_over = [], []
+    for start in range(0, len(crops), batch_size):
+        batch = preprocessor.from_crops(crops[start:start + batch_size])
+        probs = age_distributions(age_model, batch)
+        ages.extend(expected_ages(probs).tolist())
+        p_over.extend(probs[:, min_age:].sum(axis=1).tolist())
+
+    rows, i = [], 0
+    for path, label, found in pending:
+        for number, status, box, crop in found:
+            row = {"source": path, "frame": number, "status": status, "label": label,
+                   "age": None, "p_over": None, "x1": None, "y1": None, "x2": None, "y2": None}
+            if crop is not None:
+                row.update(age=ages[i], p_over=p_over[i], x1=box[0], y1=box[1], x2=box[2], y2=box[3])
+                i += 1
+            rows.append(row)
+    return rows
+
+def summarize(rows, min_age, elapsed, faces_scored):
+    def number(value):
+        return None if value in (None, "") else float(value)
+
+    labelled = [(number(r["label"]), number(r["age"])) for r in rows
+                if number(r["label"]) is not None and number(r["age"]) is not None]
+    print(f"{len(rows)} rows, {sum(number(r['age']) is not None for r in rows)} with a face")
+    if elapsed > 0:
+        print(f"this run: {faces_scored} faces in {elapsed:.1f} s, {faces_scored / elapsed:.1f} faces/s")
+    if labelled:
+        labels, ages = np.array(labelled).T
+        agree = np.mean((labels >= min_age) == (ages >= min_age))
+        print(f"MAE {np.abs(ages - labels).mean():.2f} years over {len(labelled)} labelled faces, "
+              f"pass/fail agreement at {min_age}: {agree:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="folder of images and/or videos")
+    parser.add_argument("out", help="results .csv, or .parquet for a folder of Parquet parts")
+    parser.add_argument("--labels", help="CSV with path and age columns")
+    parser.add_argument("--filename-age", action="store_true", help="take the label from the file name")
+    parser.add_argument("--detector", default="yolo", help="none (pre-cropped faces), haar, yolo or gated")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--every", type=int, default=1, help="score every n-th video frame")
+    parser.add_argument("--backend", default="eager",
+                        help="eager (the checkpoint itself), torchscript, onnx, int8 or auto")
+    parser.add_argument("--weights", default=AGE_MODEL_PATH, help="age model checkpoint to score")
+    parser.add_argument("--min-age", type=int, default=MIN_AGE)
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels, args.input) if args.labels else {}
+    writer = ResultWriter(args.out)
+    done = writer.done()
+    tasks, skipped = [], 0
+    for path in list_sources(args.input):
+        label = labels.get(os.path.normpath(path), filename_age(path) if args.filename_age else None)
+        for task in source_tasks(path, label, args.every):
+            # a task's rows are written together, so its first frame marks it done
+            if (path, task[3]) in done:
+                skipped += 1
+            else:
+                tasks.append(task)
+    print(f"{len(tasks)} images and video chunks to score, {skipped} already done")
+
+    # only the age model: detection happens in the workers
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    backend = resolve_backend(args.backend, args.weights, device)
+    age_model = load_age_backend(backend, args.weights, device)
+    preprocessor = FacePreprocessor(device, max_batch=args.batch_size)
+    print(f"Scoring {args.weights} with the {backend} backend")
+
+    start, faces_scored = time.perf_counter(), 0
+    context = multiprocessing.get_context("spawn")  # no forked torch or CUDA state in the workers
+    with context.Pool(args.workers, init_worker, (args.detector, YOLO_MODEL_PATH)) as pool:
+        pending, pending_faces = [], 0
+        for path, label, found in pool.imap_unordered(decode_and_detect, tasks, chunksize=4):
+            pending.append((path, label, found))
+            pending_faces += sum(crop is not None for _, _, _, crop in found)
+            if pending_faces >= FLUSH_FACES:
+                writer.write(score(pending, age_model, preprocessor, args.batch_size, args.min_age))
+                faces_scored += pending_faces
+                pending, pending_faces = [], 0
+        writer.write(score(pending, age_model, preprocessor, args.batch_size, args.min_age))
+        faces_scored += pending_faces
+
+    summarize(writer.rows, args.min_age, time.perf_counter() - start, faces_scored)
+
+
+if __name__ == "__main__":
+    main()
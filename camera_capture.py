@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque, namedtuple
+import cv2
+from rate_governor import IDLE_FPS
+
+# ==== CONFIG ====
+RING_SIZE = 3  # newest frames kept; older ones are dropped
+FPS_SMOOTHING = 0.1  # weight of the newest interval in the fps average
+EXPOSURE_SETTLE = 2.0  # seconds after the first frame before auto-exposure is trusted
+CAMERA_DEVICE = 0
+# =================
+
+# image is the BGR frame, timestamp is time.monotonic() right after the read
+Frame = namedtuple("Frame", ["image", "timestamp", "index"])
+
+
+# ---------------- Capture Service ----------------
+class CaptureService:
+    """
+    Reads a cv2.VideoCapture on its own thread into a small ring buffer of
+    timestamped frames. Consumers never block the reader: latest() returns
+    the newest frame immediately, wait_newer() waits for the next one.
+    `capture` may also be a callable returning the VideoCapture; the slow
+    device open then happens on the reader thread too. A device that does
+    not open stops the service with `failed` set.
+    """
+    def __init__(self, capture, ring_size=RING_SIZE, settle=EXPOSURE_SETTLE):
+        self.capture = None if callable(capture) else capture
+        self._open = capture if callable(capture) else None
+        self.settle = settle
+        self.frame_interval = 0.0  # minimum seconds between reads; 0 follows the camera
+        self.first_frame_at = None
+        self.frames = deque(maxlen=ring_size)
+        self.fps = 0.0
+        self.frames_read = 0
+        self.frames_dropped = 0  # replaced by a newer frame before anyone took them
+        self.read_failures = 0
+        self.failed = False  # the device did not open
+        self._served_index = -1
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="camera-capture", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def latest(self):
+        """Newest Frame, or None before the first read. Never blocks."""
+        with self._cond:
+            return self._serve(self.frames[-1]) if self.frames else None
+
+    def wait_newer(self, after_index, timeout=None):
+        """Newest Frame with an index above after_index; None on timeout or stop."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._stopped.is_set() or (self.frames and self.frames[-1].index > after_index),
+                timeout,
+            )
+            if self._stopped.is_set() or not self.frames or self.frames[-1].index <= after_index:
+                return None
+            return self._serve(self.frames[-1])
+
+    def settled(self, frame):
+        """True once the frame is `settle` seconds past the first one."""
+        return self.first_frame_at is not None and frame.timestamp - self.first_frame_at >= self.settle
+
+    def stats(self):
+        return {
+            "fps": self.fps,
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "read_failures": self.read_failures,
+        }
+
+    def isOpened(self):
+        """True while running; a device still being opened counts as open."""
+        return not self._stopped.is_set() and (self.capture is None or self.capture.isOpened())
+
+    def release(self):
+        """Stop the reader thread and release the device."""
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread.is_alive() and threading.current_thread() is not self._thread:
+            self._thread.join()
+        if self.capture is not None:
+            self.capture.release()
+
+    def _serve(self, frame):
+        self._served_index = max(self._served_index, frame.index)
+        return frame
+
+    def _run(self):
+        if self.capture is None:
+            self.capture = self._open()
+        if not self.capture.isOpened():
+            print("Camera could not be opened")
+            self.failed = True
+            self._stopped.set()
+            with self._cond:
+                self._cond.notify_all()
+            return
+        # keep the driver from queueing stale frames of its own
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        last = None
+        while not self._stopped.is_set():
+            if self.frame_interval and last is not None:
+                self._stopped.wait(max(0.0, last + self.frame_interval - time.monotonic()))
+            ret, image = self.capture.read()
+            now = time.monotonic()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+
+            if last is not None and now > last:
+                self.fps += FPS_SMOOTHING * (1.0 / (now - last) - self.fps)
+            last = now
+            if self.first_frame_at is None:
+                self.first_frame_at = now
+
+            with self._cond:
+                if self.frames and self.frames[-1].index > self._served_index:
+                    self.frames_dropped += 1
+                self.frames.append(Frame(image, now, self.frames_read))
+                self.frames_read += 1
+                self._cond.notify_all()
+
+
+# ---------------- Camera Manager ----------------
+class CameraManager:
+    """
+    Owns the camera for the whole app. open() starts the device in the
+    background (call it early, so exposure has settled by the time the check
+    starts); preview widgets attach() and detach() while it keeps running;
+    close() stops every consumer and releases the device. With no consumer
+    attached the camera is read at IDLE_FPS only.
+    """
+    def __init__(self, device=CAMERA_DEVICE, settle=EXPOSURE_SETTLE, idle_fps=IDLE_FPS):
+        self.device = device
+        self.settle = settle
+        self.idle_interval = 1.0 / idle_fps
+        self.capture = None
+        self.consumers = []
+
+    @property
+    def is_open(self):
+        return self.capture is not None and self.capture.isOpened()
+
+    def open(self):
+        """
+        Start the camera unless it is already running; returns its
+        CaptureService. A service that stopped (e.g. the device failed to
+        open) is released and the device is tried again.
+        """
+        if not self.is_open:
+            self._release()
+            self.capture = CaptureService(lambda: cv2.VideoCapture(self.device), settle=self.settle)
+            if not self.consumers:
+                self.capture.frame_interval = self.idle_interval
+            self.capture.start()
+        return self.capture
+
+    def attach(self, consumer):
+        """Register a consumer with a stop() method, e.g. a KivyCamera."""
+        if consumer not in self.consumers:
+            self.consumers.append(consumer)
+
+    def detach(self, consumer):
+        """Stop one consumer; the camera keeps running for the next one."""
+        if consumer in self.consumers:
+            self.consumers.remove(consumer)
+            consumer.stop()
+            if not self.consumers and self.capture is not None:
+                self.capture.frame_interval = self.idle_interval
+
+    def close(self):
+        for consumer in list(self.consumers):
+            self.detach(consumer)
+        self._release()
+
+    def _release(self):
+        if self.capture is not None:
+            # joining a reader that is still opening the device can take seconds
+            threading.Thread(target=self.capture.release, name="camera-release", daemon=True).start()
+            self.capture = None
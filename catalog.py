@@ -0,0 +1,109 @@
+import csv
+import os
+import sqlite3
+from collections import namedtuple
+
+# ==== CONFIG ====
+CATALOG_PATH = "./products.csv"  # .csv, or a SQLite file with a products table
+# =================
+
+# price in euros; age_restricted products need an age check before paying
+Product = namedtuple("Product", ["sku", "name", "price", "age_restricted"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    sku TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    age_restricted INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+# ---------------- Catalog ----------------
+class Catalog:
+    """
+    Product catalog in SQLite, looked up by barcode/SKU through the primary
+    key index. A CSV file (sku, name, price, age_restricted) is loaded into
+    an in-memory database once; a SQLite file is queried in place.
+    """
+    def __init__(self, path=CATALOG_PATH):
+        if path.lower().endswith(".csv"):
+            self.db = sqlite3.connect(":memory:")
+            self.db.execute(SCHEMA)
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = [
+                    (row["sku"], row["name"], float(row["price"]), int(row["age_restricted"]))
+                    for row in csv.DictReader(f)
+                ]
+            with self.db:
+                self.db.executemany("INSERT INTO products VALUES (?, ?, ?, ?)", rows)
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            self.db = sqlite3.connect(path)
+            self.db.execute(SCHEMA)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def lookup(self, sku):
+        """The Product for a scanned barcode/SKU, or None."""
+        row = self.db.execute(
+            "SELECT sku, name, price, age_restricted FROM products WHERE sku = ?", (sku,)
+        ).fetchone()
+        return self._product(row) if row else None
+
+    def products(self, limit=None):
+        """Products in catalog order, e.g. for the demo shelf."""
+        rows = self.db.execute(
+            "SELECT sku, name, price, age_restricted FROM products ORDER BY rowid LIMIT ?",
+            (-1 if limit is None else limit,),
+        )
+        return [self._product(row) for row in rows]
+
+    @staticmethod
+    def _product(row):
+        sku, name, price, restricted = row
+        return Product(sku, name, price, bool(restricted))
+
+
+# ---------------- Cart ----------------
+class Cart:
+    """
+    Scanned products with a running total (kept in cents, so it never
+    drifts) and a count of age-restricted items; every scan is O(1).
+    """
+    def __init__(self):
+        self.items = []
+        self.total_cents = 0
+        self.restricted_count = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def total(self):
+        return self.total_cents / 100
+
+    def add(self, product):
+        self.items.append(product)
+        self.total_cents += round(product.price * 100)
+        self.restricted_count += product.age_restricted
+
+    def remove_restricted(self):
+        """Take every age-restricted product out; returns how many were removed."""
+        removed = self.restricted_count
+        if removed:
+            self.items = [p for p in self.items if not p.age_restricted]
+            self.total_cents = sum(round(p.price * 100) for p in self.items)
+            self.restricted_count = 0
+        return removed
+
+    def clear(self):
+        self.items = []
+        self.total_cents = 0
+        self.restricted_count = 0
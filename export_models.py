@@ -0,0 +1,112 @@
+"""
+Export the age model and YOLO face detector to TorchScript and ONNX, then
+check that the exported age models predict the same ages as eager PyTorch.
+
+    python export_models.py --images ./faces
+    python export_models.py --formats onnx --images ./faces --tolerance 0.25
+
+An export that passes is recorded in a .parity.json marker next to it,
+with the checkpoint's hash; AGE_BACKEND=auto only uses exports whose
+marker matches the current checkpoint and was checked on real faces.
+An export that fails the check is deleted.
+"""
+import argparse
+import glob
+import os
+import shutil
+import cv2
+import torch
+from model import (
+    AGE_MODEL_PATH, YOLO_MODEL_PATH, EXPORT_DIR, OUTPUT_SIZE, PARITY_TOLERANCE, PREPROCESS,
+    FacePreparer, load_age_model, load_age_backend, exported_path, check_parity,
+    parity_marker_path, write_parity_marker,
+)
+
+FORMATS = ("torchscript", "onnx")
+
+
+# ---------------- Export ----------------
+def export_age_model(model, weights_path, fmt):
+    """Write the eager age model as a frozen TorchScript or ONNX file."""
+    path = exported_path(weights_path, fmt)
+    example = torch.zeros(1, 3, OUTPUT_SIZE, OUTPUT_SIZE)
+    with torch.no_grad():
+        if fmt == "torchscript":
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+            traced.save(path)
+        else:
+            torch.onnx.export(
+                model, example, path,
+                input_names=["input"], output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=17,
+            )
+    return path
+
+def export_face_detector(yolo_model_path, fmt):
+    """Let ultralytics export the detector, then move it next to the age model."""
+    from ultralytics import YOLO
+    written = YOLO(yolo_model_path).export(format=fmt)
+    path = exported_path(yolo_model_path, fmt)
+    shutil.move(written, path)
+    return path
+
+
+# ---------------- Parity ----------------
+def parity_batch(images_dir):
+    """Face crops from a folder of images, or random input when none is given."""
+    if not images_dir:
+        print("WARNING: no --images given, checking parity on random noise instead of faces.\n"
+              "WARNING: the exports will not be marked as verified, so AGE_BACKEND=auto will not use them.")
+        return torch.rand(8, 3, OUTPUT_SIZE, OUTPUT_SIZE)
+    preparer = FacePreparer()
+    faces = []
+    for path in sorted(glob.glob(os.path.join(images_dir, "*"))):
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        try:
+            faces.append(PREPROCESS(preparer.from_frame(frame)))
+        except ValueError:
+            continue
+    if not faces:
+        raise SystemExit(f"No faces found in {images_dir}")
+    return torch.stack(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=AGE_MODEL_PATH, help="age model checkpoint")
+    parser.add_argument("--yolo", default=YOLO_MODEL_PATH, help="YOLO face detector weights")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--images", help="folder of face images for the parity check")
+    parser.add_argument("--tolerance", type=float, default=PARITY_TOLERANCE, help="max age difference in years")
+    args = parser.parse_args()
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    device = torch.device("cpu")
+    model = load_age_model(args.weights, device)
+    batch = parity_batch(args.images)
+
+    failed = False
+    for fmt in args.formats:
+        path = exported_path(args.weights, fmt)
+        if os.path.exists(parity_marker_path(path)):
+            os.remove(parity_marker_path(path))  # the old marker does not vouch for the new export
+        print(f"[{fmt}] age model   -> {export_age_model(model, args.weights, fmt)}")
+        print(f"[{fmt}] face model  -> {export_face_detector(args.yolo, fmt)}")
+        ok, max_diff = check_parity(model, load_age_backend(fmt, args.weights, device), batch, args.tolerance)
+        print(f"[{fmt}] parity: max age difference {max_diff:.3f} years ({'OK' if ok else 'FAILED'})")
+        if ok:
+            write_parity_marker(path, args.weights, max_diff, len(batch) if args.images else 0)
+        else:
+            os.remove(path)
+            print(f"[{fmt}] removed {path}")
+        failed = failed or not ok
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
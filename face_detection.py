@@ -0,0 +1,157 @@
+import cv2
+import numpy as np
+from collections import deque, namedtuple
+
+# ==== CONFIG ====
+DETECTOR = "gated"  # "haar", "yolo", or "gated": YOLO only on the region Haar found
+HAAR_MIN_SIZE = (100, 100)
+ROI_MARGIN = 0.5  # extra context around the Haar boxes, as a fraction of their size
+MAX_FACES = 4  # faces scored per frame
+DETECT_SCALE = 0.5  # detect on a frame downscaled by this factor; 1.0 disables
+ADAPTIVE_SCALE = True  # follow the face sizes seen recently
+TARGET_FACE_SIZE = 96  # face width (px) on the downscaled frame the adaptive scale aims for
+SCALE_LIMITS = (0.2, 1.0)
+SCALE_HISTORY = 15  # recent faces the adaptive scale looks at
+HAAR_MIN_WINDOW = 24  # the cascade's own window; min_size never shrinks below it
+RANK_WEIGHTS = {"size": 0.5, "centrality": 0.3, "confidence": 0.2}
+# =================
+
+# box is (x1, y1, x2, y2) in frame pixels; score is detector-specific
+Detection = namedtuple("Detection", ["box", "score"])
+
+
+# ---------------- Detectors ----------------
+class HaarDetector:
+    """OpenCV Haar cascade; cheap, but gives no confidence (every score is 1.0)."""
+    def __init__(self, min_size=HAAR_MIN_SIZE):
+        self.cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        self.min_size = min_size
+
+    def detect(self, frame, scale=1.0):
+        """scale tells how much the frame was downscaled, so min_size shrinks with it."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        min_size = tuple(max(HAAR_MIN_WINDOW, int(v * scale)) for v in self.min_size)
+        faces = self.cascade.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=min_size
+        )
+        return [Detection((float(x), float(y), float(x + w), float(y + h)), 1.0) for x, y, w, h in faces]
+
+class YoloDetector:
+    """YOLO face detector; scores are confidences."""
+    def __init__(self, yolo):
+        self.yolo = yolo
+
+    def detect(self, frame, scale=1.0):
+        boxes = self.yolo(frame, verbose=False)[0].boxes
+        return [
+            Detection(tuple(box), float(score))
+            for box, score in zip(boxes.xyxy.tolist(), boxes.conf.tolist())
+        ]
+
+class GatedYoloDetector:
+    """Haar on the full frame as a gate, then YOLO only on the region it found."""
+    def __init__(self, yolo, margin=ROI_MARGIN):
+        self.haar = HaarDetector()
+        self.yolo = YoloDetector(yolo)
+        self.margin = margin
+
+    def detect(self, frame, scale=1.0):
+        gated = self.haar.detect(frame, scale)
+        if not gated:
+            return []
+
+        h_img, w_img = frame.shape[:2]
+        x1 = min(d.box[0] for d in gated)
+        y1 = min(d.box[1] for d in gated)
+        x2 = max(d.box[2] for d in gated)
+        y2 = max(d.box[3] for d in gated)
+        pad_w, pad_h = self.margin * (x2 - x1), self.margin * (y2 - y1)
+        x1, y1 = int(max(0, x1 - pad_w)), int(max(0, y1 - pad_h))
+        x2, y2 = int(min(w_img, x2 + pad_w)), int(min(h_img, y2 + pad_h))
+
+        detections = []
+        for d in self.yolo.detect(frame[y1:y2, x1:x2]):
+            bx1, by1, bx2, by2 = d.box
+            detections.append(Detection((bx1 + x1, by1 + y1, bx2 + x1, by2 + y1), d.score))
+        return detections
+
+class ScaledDetector:
+    """
+    Runs a detector on a downscaled copy of the frame and maps the boxes back
+    to full-resolution coordinates, so crops still use every pixel. With
+    `adaptive`, the scale follows the recent face sizes: big faces close to
+    the camera are found on a much smaller image.
+    """
+    def __init__(self, detector, scale=DETECT_SCALE, adaptive=ADAPTIVE_SCALE):
+        self.detector = detector
+        self.initial_scale = scale
+        self.scale = scale
+        self.adaptive = adaptive
+        self.recent_sizes = deque(maxlen=SCALE_HISTORY)  # face widths in full-resolution pixels
+
+    def detect(self, frame):
+        scale = self.scale
+        if scale < 1.0:
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = frame
+        detections = [
+            Detection(tuple(v / scale for v in d.box), d.score)
+            for d in self.detector.detect(small, scale)
+        ]
+        if self.adaptive:
+            self._adapt(detections)
+        return detections
+
+    def _adapt(self, detections):
+        if detections:
+            self.recent_sizes.append(min(d.box[2] - d.box[0] for d in detections))
+            scale = TARGET_FACE_SIZE / float(np.median(self.recent_sizes))
+        else:
+            # nothing found: drift back, in case faces became too small to see
+            self.recent_sizes.clear()
+            scale = (self.scale + max(self.scale, self.initial_scale)) / 2
+        self.scale = float(np.clip(scale, *SCALE_LIMITS))
+
+def make_detector(kind=DETECTOR, yolo=None, scale=DETECT_SCALE):
+    """
+    Build a "haar", "yolo" or "gated" detector; the YOLO ones need a loaded
+    model. Below scale 1.0 it detects on downscaled frames.
+    """
+    if kind == "haar":
+        detector = HaarDetector()
+    elif kind == "yolo":
+        detector = YoloDetector(yolo)
+    elif kind == "gated":
+        detector = GatedYoloDetector(yolo)
+    else:
+        raise ValueError(f"Unknown detector: {kind}")
+    return ScaledDetector(detector, scale) if scale < 1.0 else detector
+
+
+# ---------------- Ranking ----------------
+def box_area(box):
+    x1, y1, x2, y2 = box
+    return max(0.0, x2 - x1) * max(0.0, y2 - y1)
+
+def rank_detections(detections, frame_shape, weights=RANK_WEIGHTS, max_faces=MAX_FACES):
+    """
+    Order detections by a weighted mix of size (relative to the largest),
+    closeness to the frame centre and detector confidence, best first.
+    """
+    if not detections:
+        return []
+    h_img, w_img = frame_shape[:2]
+    largest = max(box_area(d.box) for d in detections) or 1.0
+    half_diagonal = ((w_img / 2) ** 2 + (h_img / 2) ** 2) ** 0.5
+
+    def rank_score(d):
+        x1, y1, x2, y2 = d.box
+        offset = (((x1 + x2) / 2 - w_img / 2) ** 2 + ((y1 + y2) / 2 - h_img / 2) ** 2) ** 0.5
+        return (weights["size"] * box_area(d.box) / largest
+                + weights["centrality"] * (1.0 - offset / half_diagonal)
+                + weights["confidence"] * min(d.score, 1.0))
+
+    return sorted(detections, key=rank_score, reverse=True)[:max_faces]
@@ -0,0 +1,144 @@
+import cv2
+import numpy as np
+from face_detection import Detection
+
+# ==== CONFIG ====
+DETECT_EVERY = 6  # run the full detector at least every N frames
+IOU_MATCH = 0.3  # minimum overlap to continue a track with a detection
+MAX_MISSES = 2  # detector passes a track may go unmatched before it is dropped
+MIN_CONFIDENCE = 0.5  # re-detect as soon as a track's confidence drops below this
+MISS_DECAY = 0.8  # confidence kept by a track the detector did not find
+MIN_FLOW_POINTS = 6  # fewer tracked corners than this and the flow is not trusted
+MAX_CORNERS = 30
+# =================
+
+
+# ---------------- Tracks ----------------
+class Track:
+    """One face followed across frames. `state` holds per-person data such as age evidence."""
+    def __init__(self, track_id, detection):
+        self.id = track_id
+        self.box = detection.box
+        self.score = detection.score
+        self.confidence = 1.0
+        self.misses = 0
+        self.state = {}
+
+    def detection(self):
+        return Detection(self.box, self.score)
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+# ---------------- Tracker ----------------
+class FaceTracker:
+    """
+    Keeps face tracks alive between detector passes. In between, boxes move
+    with the median Lucas-Kanade optical flow of corners inside them; the
+    detector runs every `detect_every` frames or when tracking gets unsure,
+    and detections are associated to tracks by IoU.
+    """
+    def __init__(self, detector, detect_every=DETECT_EVERY):
+        self.detector = detector
+        self.detect_every = detect_every
+        self.tracks = []
+        self.frames = 0
+        self.detector_runs = 0
+        self._next_id = 1
+        self._prev_gray = None
+        self._since_detect = 0
+
+    def reset(self):
+        """Drop every track, e.g. for the next person; the detector is kept."""
+        self.tracks = []
+        self._prev_gray = None
+        self._since_detect = 0
+
+    def update(self, frame):
+        """Advance all tracks to this frame; returns the live tracks."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.frames += 1
+        self._since_detect += 1
+
+        detect = (
+            not self.tracks
+            or self._prev_gray is None
+            or self._since_detect >= self.detect_every
+            or not self._propagate(gray)
+        )
+        if detect:
+            self._associate(self.detector.detect(frame))
+            self.detector_runs += 1
+            self._since_detect = 0
+
+        self._prev_gray = gray
+        return self.tracks
+
+    def detections(self):
+        """Tracks seen or followed in this frame, as Detections for the predict functions."""
+        return [track.detection() for track in self.tracks if track.misses == 0]
+
+    def track_for(self, box):
+        return next((track for track in self.tracks if track.box == box), None)
+
+    def _propagate(self, gray):
+        """Move every track with optical flow; False when any track lost confidence."""
+        h_img, w_img = gray.shape[:2]
+        for track in self.tracks:
+            x1, y1, x2, y2 = (int(v) for v in track.box)
+            x1, y1 = max(0, x1), max(0, y1)
+            corners = cv2.goodFeaturesToTrack(self._prev_gray[y1:y2, x1:x2], MAX_CORNERS, 0.01, 5)
+            if corners is None or len(corners) < MIN_FLOW_POINTS:
+                track.confidence = 0.0
+                continue
+            corners += np.array([x1, y1], dtype=np.float32)  # ROI -> frame coordinates
+
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, corners, None)
+            ok = status.ravel() == 1
+            if ok.sum() < MIN_FLOW_POINTS:
+                track.confidence = 0.0
+                continue
+
+            dx, dy = np.median((moved[ok] - corners[ok]).reshape(-1, 2), axis=0)
+            track.box = (
+                float(np.clip(track.box[0] + dx, 0, w_img)), float(np.clip(track.box[1] + dy, 0, h_img)),
+                float(np.clip(track.box[2] + dx, 0, w_img)), float(np.clip(track.box[3] + dy, 0, h_img)),
+            )
+            track.confidence *= float(ok.mean())
+        return all(track.confidence >= MIN_CONFIDENCE for track in self.tracks)
+
+    def _associate(self, detections):
+        """Greedy IoU matching: continue, start and end tracks."""
+        pairs = sorted(
+            ((iou(track.box, d.box), t, j) for t, track in enumerate(self.tracks) for j, d in enumerate(detections)),
+            reverse=True,
+        )
+        matched_tracks, matched_dets = set(), set()
+        for overlap, t, j in pairs:
+            if overlap < IOU_MATCH:
+                break
+            if t in matched_tracks or j in matched_dets:
+                continue
+            track, detection = self.tracks[t], detections[j]
+            track.box, track.score = detection.box, detection.score
+            track.confidence, track.misses = 1.0, 0
+            matched_tracks.add(t)
+            matched_dets.add(j)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                # decayed rather than zeroed: one miss must not force the
+                # detector onto every following frame
+                track.misses += 1
+                track.confidence *= MISS_DECAY
+        self.tracks = [track for track in self.tracks if track.misses <= MAX_MISSES]
+
+        for j, detection in enumerate(detections):
+            if j not in matched_dets:
+                self.tracks.append(Track(self._next_id, detection))
+                self._next_id += 1
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+from collections import namedtuple
+from face_detection import rank_detections
+
+# ==== CONFIG ====
+THRESHOLD = 70.0  # sharpness threshold of the full-frame is_image_sharp
+QUALITY_SIZE = 64  # the face ROI is scored at this size (px)
+SHARPNESS_REF = 150.0  # Laplacian variance of the small ROI that counts as fully sharp
+BRIGHTNESS_RANGE = (70.0, 190.0)  # mean grey level that counts as well exposed
+CLIPPED_LIMIT = 0.25  # fraction of near-black/white pixels that makes exposure unusable
+FACE_SIZE_RANGE = (80, 160)  # face width (px): below the first it is not at the lane, above the second it is ideal
+SECOND_FACE_RATIO = 0.7  # another face at least this wide, relative to the primary one, is a second customer
+MIN_SYMMETRY = 0.2  # left/right correlation of a face turned fully sideways
+QUALITY_THRESHOLD = 0.5
+QUALITY_WEIGHTS = {"sharpness": 0.35, "exposure": 0.25, "size": 0.2, "pose": 0.2}
+# =================
+
+FaceQuality = namedtuple("FaceQuality", ["score", "sharpness", "exposure", "size", "pose"])
+
+
+def is_image_sharp(frame, threshold):
+    """Return True if frame is sharp enough."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return variance > threshold
+
+
+# ---------------- Face Quality ----------------
+def size_score(box):
+    low, high = FACE_SIZE_RANGE
+    return float(np.clip((box[2] - box[0] - low) / (high - low), 0.0, 1.0))
+
+def face_quality(frame, box):
+    """
+    Score a face ROI from 0 to 1 on sharpness, exposure, size and rough
+    frontal pose, at QUALITY_SIZE and in float32. The combined score is a
+    weighted geometric mean, so one unusable aspect rejects the face.
+    """
+    size = size_score(box)
+    h_img, w_img = frame.shape[:2]
+    x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+    x2, y2 = min(w_img, int(box[2])), min(h_img, int(box[3]))
+    if size == 0.0 or x2 <= x1 or y2 <= y1:
+        return FaceQuality(0.0, 0.0, 0.0, size, 0.0)
+
+    small = cv2.resize(frame[y1:y2, x1:x2], (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    sharpness = min(1.0, float(cv2.Laplacian(gray, cv2.CV_32F).var()) / SHARPNESS_REF)
+
+    low, high = BRIGHTNESS_RANGE
+    mean = float(gray.mean())
+    brightness = 1.0 - min(1.0, max(low - mean, mean - high, 0.0) / low)
+    clipped = float(np.count_nonzero((gray < 10) | (gray > 245))) / gray.size
+    exposure = brightness * max(0.0, 1.0 - clipped / CLIPPED_LIMIT)
+
+    # a frontal face is roughly mirror-symmetric around its vertical axis
+    half = QUALITY_SIZE // 2
+    left, right = gray[:, :half].ravel(), gray[:, :half - 1:-1].ravel()
+    symmetry = float(np.corrcoef(left, right)[0, 1]) if left.std() > 0 and right.std() > 0 else 0.0
+    pose = float(np.clip((symmetry - MIN_SYMMETRY) / (1.0 - MIN_SYMMETRY), 0.0, 1.0))
+
+    parts = {"sharpness": sharpness, "exposure": exposure, "size": size, "pose": pose}
+    score = 1.0
+    for name, weight in QUALITY_WEIGHTS.items():
+        score *= parts[name] ** weight
+    return FaceQuality(score ** (1.0 / sum(QUALITY_WEIGHTS.values())), sharpness, exposure, size, pose)
+
+def nearby_faces(detections, frame_shape):
+    """Faces large enough to be at the lane, ranked; the first is the primary face."""
+    return rank_detections([d for d in detections if size_score(d.box) > 0.0], frame_shape)
+
+def second_customer(faces):
+    """True when, besides the primary face, another face at the lane is about as close."""
+    if len(faces) < 2:
+        return False
+    primary = faces[0].box[2] - faces[0].box[0]
+    return any(d.box[2] - d.box[0] >= SECOND_FACE_RATIO * primary for d in faces[1:])
+
+def gate_faces(frame, detections, threshold=QUALITY_THRESHOLD):
+    """
+    Apply the quality gate to the primary face of a frame, the best-ranked
+    one at the lane (see nearby_faces); bystanders are neither gated nor
+    scored. Returns [primary], or [] to reject the frame.
+    """
+    nearby = nearby_faces(detections, frame.shape)
+    if not nearby or face_quality(frame, nearby[0].box).score < threshold:
+        return []
+    return nearby[:1]
@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+
+# ==== CONFIG ====
+QUEUE_SIZE = 1  # frames waiting for inference; older frames are dropped
+# =================
+
+
+# ---------------- Latest-Frame Queue ----------------
+class LatestFrameQueue:
+    """Bounded queue where a new frame pushes out the oldest waiting one."""
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest waiting item, or None when closed or timed out."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if self._closed or not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+
+# ---------------- Inference Worker ----------------
+class InferenceWorker:
+    """
+    Runs a slow per-frame function on a background thread.
+    - process: callable(frame) -> result, or None when the frame gave nothing
+    - on_result: called from the worker thread with every non-None result
+    - on_error: called from the worker thread with any exception raised
+    - source: optional CaptureService; the worker then pulls the newest
+      camera Frame itself instead of waiting for submit()
+    - pace: optional callable giving the seconds to wait before the next frame
+    """
+    def __init__(self, process, on_result, on_error=None, maxsize=QUEUE_SIZE, source=None, pace=None):
+        self.process = process
+        self.on_result = on_result
+        self.on_error = on_error or (lambda e: print("Prediction error:", e))
+        self.queue = LatestFrameQueue(maxsize)
+        self.source = source
+        self.pace = pace
+        self._last_index = -1
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+        self._thread.start()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def submit(self, frame):
+        """Queue a frame without blocking; a waiting older frame is dropped."""
+        if not self.stopped:
+            self.queue.put(frame)
+
+    def stop(self, timeout=None):
+        """Stop the worker. Safe to call from any thread, including the worker."""
+        self._stopped.set()
+        self.queue.close()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def _next_frame(self):
+        if self.source is None:
+            return self.queue.get()
+        frame = self.source.wait_newer(self._last_index, timeout=0.5)
+        if frame is not None:
+            self._last_index = frame.index
+        return frame
+
+    def _run(self):
+        while not self.stopped:
+            frame = self._next_frame()
+            if frame is None:
+                continue
+            try:
+                result = self.process(frame)
+            except Exception as e:
+                self.on_error(e)
+                continue
+            if result is not None and not self.stopped:
+                self.on_result(result)
+            if self.pace is not None:
+                self._stopped.wait(self.pace())
@@ -1,64 +1,115 @@
 from kivy.uix.image import Image
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
-import cv2
 import time
-from model import predict_age
-
-THRESHOLD = 70.0  # sharpness threshold
-
-
-def is_image_sharp(frame, threshold):
-    """Return True if frame is sharp enough."""
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
-    return variance > threshold
+from inference_worker import InferenceWorker
+from age_pipeline import DECIDED, NO_FACE, AgeCheckPipeline
+from rate_governor import RateGovernor
+from metrics import CAPTURE_DROPPED, CAPTURE_FPS, ERRORS
 
 
 # ---------------- Kivy Camera Widget ----------------
 class KivyCamera(Image):
-    def __init__(self, capture, parent_screen, fps=30, **kwargs):
+    def __init__(self, capture, parent_screen, fps=30, min_age=25, **kwargs):
         super().__init__(**kwargs)
         self.capture = capture
         self.parent_screen = parent_screen  # store ScanScreen reference
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
+        self.min_age = min_age
+
+        self.shown_index = -1
+        self.dropped_at_start = capture.stats()["frames_dropped"]
 
-        # track start time for 30s warm-up
-        self.start_time = time.time()
+        # detection and age prediction pull frames from the capture service
+        # on their own thread, independently of the preview
+        self.active = True
+        self.pipeline = AgeCheckPipeline(min_age)
+        # preview, capture and analysis slow down while nobody is in view
+        self.governor = RateGovernor(active_fps=fps)
+        capture.frame_interval = self.governor.capture_interval
+        self.worker = InferenceWorker(self.analyse_frame, self.on_age_predicted, self.on_error,
+                                      source=capture, pace=self.governor.delay)
 
-        # schedule frame updates
-        Clock.schedule_interval(self.update, 1.0 / fps)
+        # schedule frame updates; stop() cancels every callback again
+        self.fps = self.governor.preview_fps
+        self._update_event = Clock.schedule_interval(self.update, 1.0 / self.fps)
+        self._deliver_event = None
 
     def update(self, dt):
-        ret, frame = self.capture.read()
-        if not ret:
+        if self.capture.failed:
+            # no camera, no AI check: hand over to staff
+            if self.active:
+                self.active = False
+                self.parent_screen.handle_camera_failed()
             return
+        if self.governor.preview_fps != self.fps:
+            self.fps = self.governor.preview_fps
+            self._update_event.cancel()
+            self._update_event = Clock.schedule_interval(self.update, 1.0 / self.fps)
+        # newest captured frame, never waits for the camera
+        frame = self.capture.latest()
+        if frame is None or frame.index == self.shown_index:
+            return
+        self.shown_index = frame.index
+        self.show_frame(frame.image)
+
+    def show_frame(self, frame):
+        """Upload the raw BGR frame into a texture that is reused per resolution."""
+        size = (frame.shape[1], frame.shape[0])
+        if self.texture is None or tuple(self.texture.size) != size:
+            texture = Texture.create(size=size, colorfmt='bgr')
+            # Mirrored effect on the GPU: same picture as cv2.flip(frame, -1)
+            # uploaded into Kivy's bottom-up texture, without touching the pixels
+            texture.flip_vertical()
+            texture.flip_horizontal()
+            self.texture = texture
+
+        # blit straight from the contiguous frame buffer, no RGB copy or tobytes()
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = frame.copy()
+        self.texture.blit_buffer(frame.reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+        self.canvas.ask_update()
 
-        # Flip for a mirrored effect
-        frame = cv2.flip(frame, -1)
-        display_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def analyse_frame(self, captured):
+        """
+        Runs on the inference worker with a captured Frame. Return
+        (age, outcome, p_over) once the pipeline decides, or None to skip
+        the frame.
+        """
+        # a camera opened moments ago is still adjusting its exposure
+        if not self.capture.settled(captured):
+            return None
+        start = time.monotonic()
+        result = self.pipeline.process(captured)
+        self.governor.observe(result.status != NO_FACE, time.monotonic() - start)
+        self.capture.frame_interval = self.governor.capture_interval
+        if result.status != DECIDED:
+            return None
+        self.governor.decided()
+        return result.age, result.outcome, result.p_over
 
-        # Compute how long the camera has been running
-        elapsed = time.time() - self.start_time
+    def on_error(self, error):
+        ERRORS.inc()
+        print("Prediction error:", error)
 
-        if elapsed >= 2:
-            # Only start detecting after 30 seconds
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100)
-            )
+    def on_age_predicted(self, result):
+        """Runs on the inference worker; hands the first result to the UI thread."""
+        print("Predicted age:", result[0])
+        self.worker.stop()
+        self._deliver_event = Clock.schedule_once(lambda dt: self.deliver_age(*result))
 
-            if len(faces) > 0 and is_image_sharp(frame, THRESHOLD):
-                try:
-                    age = predict_age(frame)
-                    print("Predicted age:", age)
-                    self.parent_screen.handle_ai_age_detected(age)
-                except Exception as e:
-                    print("Prediction error:", e)
+    def deliver_age(self, age, outcome, p_over):
+        if self.active:
+            self.active = False
+            self.parent_screen.handle_ai_age_detected(age, outcome, p_over)
 
-        # Display the frame
-        texture = Texture.create(size=(display_frame.shape[1], display_frame.shape[0]), colorfmt='rgb')
-        texture.blit_buffer(display_frame.tobytes(), colorfmt='rgb', bufferfmt='ubyte')
-        self.texture = texture
+    def stop(self):
+        """Stop the preview and background inference; late results are discarded."""
+        self.active = False
+        self._update_event.cancel()
+        if self._deliver_event is not None:
+            self._deliver_event.cancel()
+        self.worker.stop(timeout=0)  # never wait on a forward pass from the UI thread
+        stats = self.capture.stats()
+        CAPTURE_FPS.set(stats["fps"])
+        CAPTURE_DROPPED.inc(stats["frames_dropped"] - self.dropped_at_start)
+        print("Camera stats:", stats)
@@ -0,0 +1,104 @@
+"""
+Simulate N checkout lanes against the age server to show what dynamic
+batching buys. Every lane is a thread with its own AgeClient that sends
+age requests back to back (or at --rate per second), like KivyCamera does
+while a customer is in view.
+
+    python load_generator.py --lanes 8 --seconds 20
+    python load_generator.py --lanes 8 --url http://127.0.0.1:8765
+
+Without --url it starts an in-process server twice, first without
+batching (max batch 1) and then with it, and compares the two runs.
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from age_server import BATCH_WINDOW, MAX_BATCH, AgeClient, AgeServer
+from model import OUTPUT_SIZE, ModelRegistry
+
+
+def run_lane(url, faces, seconds, rate, latencies, errors):
+    client = AgeClient(url)
+    rng = np.random.default_rng()
+    crops = rng.integers(0, 256, (faces, OUTPUT_SIZE, OUTPUT_SIZE, 3), dtype=np.uint8)
+    interval = 1.0 / rate if rate else 0.0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.monotonic()
+        try:
+            client.distributions(crops)
+        except ConnectionError as e:
+            errors.append(str(e))
+        else:
+            latencies.append(time.monotonic() - start)
+        time.sleep(max(0.0, interval - (time.monotonic() - start)))
+    client.close()
+
+def run_load(url, lanes, faces, seconds, rate):
+    """Drive all lanes at once; returns throughput and latency figures."""
+    latencies, errors = [], []  # list.append is atomic, no lock needed
+    threads = [
+        threading.Thread(target=run_lane, args=(url, faces, seconds, rate, latencies, errors), daemon=True)
+        for _ in range(lanes)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - start
+
+    ms = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    p50, p95 = np.percentile(ms, [50, 95])
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "faces_per_sec": len(latencies) * faces / wall,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+    }
+
+def print_result(name, result, server=None):
+    line = (f"{name:<12}{result['faces_per_sec']:>10.1f} faces/s  p50 {result['p50_ms']:7.1f} ms  "
+            f"p95 {result['p95_ms']:7.1f} ms  {result['errors']} errors")
+    if server is not None and server.batcher.batches:
+        line += f"  {server.batcher.faces / server.batcher.batches:.1f} faces/batch"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lanes", type=int, default=8)
+    parser.add_argument("--faces", type=int, default=1, help="faces per request")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second per lane; 0 = back to back")
+    parser.add_argument("--url", help="existing age server; default: start one in-process")
+    parser.add_argument("--backend", default="auto", help="eager, torchscript, onnx, int8 or auto")
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+    print(f"{args.lanes} lanes, {args.faces} face(s) per request, {args.seconds:.0f} s per run")
+
+    if args.url:
+        print_result("server", run_load(args.url, args.lanes, args.faces, args.seconds, args.rate))
+        return
+
+    registry = ModelRegistry(backend=args.backend).load()
+    results = {}
+    for name, window, max_batch in (("unbatched", 0.0, 1), ("batched", args.window, args.max_batch)):
+        server = AgeServer(registry, port=0, window=window, max_batch=max_batch).start()
+        try:
+            url = f"http://127.0.0.1:{server.port}"
+            results[name] = run_load(url, args.lanes, args.faces, args.seconds, args.rate)
+            print_result(name, results[name], server)
+        finally:
+            server.stop()
+
+    if results["unbatched"]["faces_per_sec"]:
+        gain = results["batched"]["faces_per_sec"] / results["unbatched"]["faces_per_sec"]
+        print(f"Batching gain: {gain:.2f}x throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,30 +6,32 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.popup import Popup
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.graphics import Color, Rectangle, Line
 from kivy.core.window import Window
 from kivy.properties import ListProperty, ObjectProperty
 from kivy.uix.image import Image
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
-import cv2
 from kivy_camera import KivyCamera
+from camera_capture import CameraManager
+from catalog import Cart, Catalog
+from model import model_registry
+from age_server import load_models_async
+from metrics import DECISION_SECONDS, OUTCOMES, metrics
+from audit_log import audit_log
+from age_decision import MIN_AGE
 import sys
 import os
+import time
 
 
-MINIMUM_LEEFTIJD_AUTO_PASS = 25
+MINIMUM_LEEFTIJD_AUTO_PASS = MIN_AGE
 Window.clearcolor = (1, 1, 1, 1)
 Window.size = (800, 600)
 
-BEER_NAME = "Heineken (33cl)"
-
-PRODUCTS = [
-    {"name": "BIO Komkommer", "price": 0.89},
-    {"name": "Milka Oreon", "price": 1.69},
-    {"name": "Volle Melk", "price": 0.99},
-    {"name": BEER_NAME, "price": 1.35},
-]
+SHELF_SIZE = 4  # products from the catalog on the demo shelf
 
 # ---------------- Draggable Product ----------------
 class DraggableProduct(Widget):
@@ -52,7 +54,7 @@ class DraggableProduct(Widget):
             self.border = Line(rectangle=(*self.pos, *self.size), width=1.5)
 
         self.label = Label(
-            text=product["name"],
+            text=product.name,
             size_hint=(None, None),
             size=self.size,
             pos=self.pos,
@@ -90,7 +92,7 @@ class DraggableProduct(Widget):
             self.y = touch.y + self._offset_y
             scanner = self.parent.scanner_area
             if self.collide_widget(scanner) and not self.scanned:
-                self.parent.add_to_cart(self.product)
+                self.parent.scan(self.product.sku)
                 self.scanned = True
                 self.parent.enable_proceed()
             return True
@@ -108,22 +110,33 @@ class ScanScreen(FloatLayout):
     scanner_area = ObjectProperty(None)
     cart_layout = ObjectProperty(None)
     total_label = ObjectProperty(None)
-    cart = []
 
-    def __init__(self, **kwargs):
+    def __init__(self, camera, catalog, **kwargs):
         super().__init__(**kwargs)
+        self.camera = camera  # CameraManager owned by CheckoutApp
+        self.catalog = catalog
+        self.cart = Cart()
         self.products_widgets = []
+        self.models_ready = model_registry.ready
+        self.models_failed = False
         self.setup_ui()
         self.create_products()
 
     # ---------------- UI Setup ----------------
-    def handle_ai_age_detected(self, age):
-        if hasattr(self, "cam_capture") and self.cam_capture.isOpened():
-            self.cam_capture.release()
+    def handle_ai_age_detected(self, age, outcome=None, p_over=None):
+        """outcome is "pass", "fail" or "undecided" when the camera already decided."""
+        if hasattr(self, "cam_widget"):
+            self.camera.detach(self.cam_widget)
         if hasattr(self, "cam_popup"):
             self.cam_popup.dismiss()
 
-        if age >= MINIMUM_LEEFTIJD_AUTO_PASS:
+        if outcome is None:
+            outcome = "pass" if age >= MINIMUM_LEEFTIJD_AUTO_PASS else "fail"
+        latency = time.monotonic() - self.ai_check_started
+        OUTCOMES.labels(outcome).inc()
+        DECISION_SECONDS.observe(latency)
+        audit_log.record("ai", outcome, age, p_over, latency)
+        if outcome == "pass":
             self.show_pay_button()
         else:
             self.show_medewerker_on_the_way()
@@ -143,12 +156,21 @@ class ScanScreen(FloatLayout):
         )
         self.add_widget(self.total_label)
 
-        self.cart_layout = BoxLayout(
-            orientation='vertical',
+        # only the visible cart lines are widgets; a scan appends one data row
+        self.cart_layout = RecycleView(
+            viewclass='Label',
             size_hint=(None, None),
             size=(200, 250),
             pos=(550, 300)
         )
+        lines = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 30),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        lines.bind(minimum_height=lines.setter('height'))
+        self.cart_layout.add_widget(lines)
         self.add_widget(self.cart_layout)
 
         self.scanner_area = Widget(
@@ -183,28 +205,41 @@ class ScanScreen(FloatLayout):
         start_y = 400
         spacing = 140
         colors = [[1, 0, 0, 1], [0, 1, 0, 1], [0, 0, 1, 1], [1, 1, 0, 1]]
-        for idx, p in enumerate(PRODUCTS):
+        for idx, p in enumerate(self.catalog.products(limit=SHELF_SIZE)):
             prod = DraggableProduct(product=p)
             prod.pos = (start_x + idx * spacing, start_y)
             prod.color = colors[idx % len(colors)]
             self.add_widget(prod)
             self.products_widgets.append(prod)
 
+    def scan(self, sku):
+        """A barcode was scanned: look it up in the catalog and add it to the cart."""
+        product = self.catalog.lookup(sku)
+        if product is None:
+            print("Unknown barcode:", sku)
+            return
+        self.add_to_cart(product)
+
     def add_to_cart(self, product):
-        self.cart.append(product)
-        self.update_cart()
+        self.cart.add(product)
+        self.cart_layout.data.append(self.cart_line(product))
+        self.update_total()
+        if product.age_restricted:
+            # an age check is coming: open the camera now, so the device and
+            # its auto-exposure are ready by the time "Verder" is pressed
+            self.camera.open()
+
+    @staticmethod
+    def cart_line(product):
+        return {"text": f"{product.name} - €{product.price:.2f}", "color": (0, 0, 0, 1)}
 
     def update_cart(self):
-        self.cart_layout.clear_widgets()
-        for item in self.cart:
-            self.cart_layout.add_widget(Label(
-                text=f"{item['name']} - €{item['price']:.2f}",
-                size_hint_y=None,
-                height=30,
-                color=(0, 0, 0, 1)
-            ))
-        total = sum(i['price'] for i in self.cart)
-        self.total_label.text = f"Total: €{total:.2f}"
+        """Rebuild the cart lines, only needed when items are removed."""
+        self.cart_layout.data = [self.cart_line(product) for product in self.cart]
+        self.update_total()
+
+    def update_total(self):
+        self.total_label.text = f"Total: €{self.cart.total:.2f}"
 
     def enable_proceed(self):
         self.proceed_button.disabled = False
@@ -215,8 +250,7 @@ class ScanScreen(FloatLayout):
         for prod in self.products_widgets:
             prod.disabled_drag = True
 
-        beer_in_cart = any(item["name"].lower() == "heineken (33cl)" for item in self.cart)
-        if beer_in_cart:
+        if self.cart.restricted_count:
             self.ask_ai_check()
         else:
             self.show_pay_button()
@@ -286,15 +320,56 @@ class ScanScreen(FloatLayout):
 
     def ai_age_check(self, popup):
         popup.dismiss()
-        self.cam_capture = cv2.VideoCapture(0)
+        self.ai_check_started = time.monotonic()
+        if self.models_failed:
+            audit_log.record("ai", "unavailable")
+            self.show_medewerker_on_the_way()
+            return
+        if not self.models_ready:
+            self.show_ai_loading(popup)
+            return
+        self.start_ai_camera(popup)
+
+    def show_ai_loading(self, popup):
+        """Wait for the model warm-up; the camera opens as soon as it is done."""
+        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        content.add_widget(Label(text="AI wordt geladen, een moment geduld..."))
+        self.ai_loading_popup = Popup(
+            title="Automatische Leeftijdscontrole (AI)",
+            content=content,
+            size_hint=(None, None),
+            size=(400, 200),
+            auto_dismiss=False
+        )
+        self.ai_loading_popup.question_popup = popup
+        self.ai_loading_popup.open()
+
+    def on_models_ready(self):
+        self.models_ready = True
+        if hasattr(self, "ai_loading_popup"):
+            loading_popup = self.ai_loading_popup
+            del self.ai_loading_popup
+            loading_popup.dismiss()
+            self.start_ai_camera(loading_popup.question_popup)
+
+    def on_models_failed(self, error):
+        self.models_failed = True
+        if hasattr(self, "ai_loading_popup"):
+            loading_popup = self.ai_loading_popup
+            del self.ai_loading_popup
+            self.show_medewerker_on_the_way(loading_popup)
+
+    def start_ai_camera(self, popup):
         layout = FloatLayout(size=(640, 480))
         self.cam_widget = KivyCamera(
-            capture=self.cam_capture,
+            capture=self.camera.open(),
             parent_screen=self,
             fps=30,
+            min_age=MINIMUM_LEEFTIJD_AUTO_PASS,
             size_hint=(1, 1),
             pos_hint={'x': 0, 'y': 0}
         )
+        self.camera.attach(self.cam_widget)
         layout.add_widget(self.cam_widget)
 
         cancel_btn = Button(
@@ -311,15 +386,27 @@ class ScanScreen(FloatLayout):
             title="Automatische Leeftijdscontrole (AI)",
             content=layout,
             size_hint=(None, None),
-            size=(640, 480)
+            size=(640, 480),
+            auto_dismiss=False  # only Cancel or a decision closes it, both detach the camera
         )
         self.cam_popup.open()
 
+    def handle_camera_failed(self):
+        if hasattr(self, "cam_widget"):
+            self.camera.detach(self.cam_widget)
+        if hasattr(self, "cam_popup"):
+            self.cam_popup.dismiss()
+        OUTCOMES.labels("unavailable").inc()
+        audit_log.record("ai", "unavailable", latency=time.monotonic() - self.ai_check_started)
+        self.show_medewerker_on_the_way()
+
     def cancel_ai_age_check(self, popup):
-        if hasattr(self, "cam_capture") and self.cam_capture.isOpened():
-            self.cam_capture.release()
+        if hasattr(self, "cam_widget"):
+            self.camera.detach(self.cam_widget)
         if hasattr(self, "cam_popup"):
             self.cam_popup.dismiss()
+        OUTCOMES.labels("cancelled").inc()
+        audit_log.record("cancel", "cancelled", latency=time.monotonic() - self.ai_check_started)
         self.show_medewerker_on_the_way(popup)
 
     def show_medewerker_on_the_way(self, popup=None):
@@ -367,9 +454,11 @@ class ScanScreen(FloatLayout):
 
     def verify_medewerker(self, popup):
         if self.code_input.text == "0000":
+            audit_log.record("staff", "login")
             popup.dismiss()
             self.show_medewerker_panel()
         else:
+            audit_log.record("staff", "login_failed")
             self.code_input.text = ""
             self.code_input.hint_text = "Wrong code, try again"
 
@@ -388,18 +477,20 @@ class ScanScreen(FloatLayout):
         younger_btn.bind(on_release=lambda x: self.age_not_ok(popup))
 
     def age_ok(self, popup):
+        audit_log.record("staff", "approved")
         popup.dismiss()
         self.show_pay_button()
 
     def age_not_ok(self, popup):
+        audit_log.record("staff", "rejected")
         popup.dismiss()
-        self.remove_beer_completely()
+        self.remove_restricted_products()
         self.show_pay_button()
 
-    def remove_beer_completely(self):
-        self.cart = [p for p in self.cart if p["name"].lower() != "beer"]
+    def remove_restricted_products(self):
+        self.cart.remove_restricted()
         for prod in self.products_widgets[:]:
-            if prod.product["name"].lower() == "beer":
+            if prod.product.age_restricted:
                 self.remove_widget(prod)
                 self.products_widgets.remove(prod)
         self.update_cart()
@@ -417,6 +508,7 @@ class ScanScreen(FloatLayout):
 
     def reset_to_home(self):
         """Reset the screen to the initial product scanning state."""
+        self.camera.close()
         self.clear_widgets()
         self.cart.clear()
         self.products_widgets.clear()
@@ -455,7 +547,28 @@ class ScanScreen(FloatLayout):
 # ---------------- App ----------------
 class CheckoutApp(App):
     def build(self):
-        return ScanScreen()
+        # opened once per customer and shared by every age check attempt
+        self.camera = CameraManager()
+        self.catalog = Catalog()
+        return ScanScreen(camera=self.camera, catalog=self.catalog)
+
+    def on_start(self):
+        metrics.start_export()
+        audit_log.start()
+        # Load the models only once the first screen is on display
+        Clock.schedule_once(self.warm_up_models, 0.5)
+
+    def on_stop(self):
+        self.camera.close()
+        metrics.stop_export()
+        audit_log.close()  # writes what is still queued
+
+    def warm_up_models(self, dt):
+        # the shared age server when one answers, otherwise the models in-process
+        load_models_async(
+            on_ready=lambda: Clock.schedule_once(lambda dt: self.root.on_models_ready()),
+            on_error=lambda e: Clock.schedule_once(lambda dt: self.root.on_models_failed(e)),
+        )
 
 
 if __name__ == "__main__":
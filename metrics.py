@@ -0,0 +1,80 @@
+"""
+Always-on metrics for the age check, defined with prometheus_client and
+exported to a file (for node_exporter's textfile collector) and/or a local
+HTTP endpoint.
+"""
+import os
+import threading
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server, write_to_textfile
+
+# ==== CONFIG ====
+METRICS_PORT = int(os.environ.get("AGE_METRICS_PORT", "0"))  # 0 disables the HTTP endpoint
+METRICS_FILE = os.environ.get("AGE_METRICS_FILE", "")  # empty disables the text file
+METRICS_INTERVAL = 15.0  # seconds between text file writes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# =================
+
+
+# ---------------- Export ----------------
+class MetricsExport:
+    """Starts and stops the configured exports of the default registry."""
+    def __init__(self):
+        self._server = None
+        self._writer = None
+        self._stopped = threading.Event()
+
+    def start_export(self, port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_INTERVAL):
+        """Start whatever export is configured; does nothing when neither is set."""
+        if port and self._server is None:
+            self._server, _ = start_http_server(port, addr="127.0.0.1")
+        if path and self._writer is None:
+            def write_loop():
+                while not self._stopped.wait(interval):
+                    write_to_textfile(path, REGISTRY)  # atomic: written to a temp file, then renamed
+            self._stopped.clear()
+            self._writer = threading.Thread(target=write_loop, name="metrics-file", daemon=True)
+            self._writer.start()
+
+    def stop_export(self, path=METRICS_FILE):
+        self._stopped.set()
+        self._writer = None
+        if path:
+            write_to_textfile(path, REGISTRY)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+metrics = MetricsExport()
+
+# ---------------- Age Check Metrics ----------------
+STAGE_SECONDS = Histogram(
+    "agecheck_stage_seconds", "Latency of each pipeline stage.", ["stage"], buckets=LATENCY_BUCKETS)
+FRAMES_SEEN = Counter(
+    "agecheck_frames_seen_total", "Camera frames offered to the age check.")
+FRAMES_REJECTED = Counter(
+    "agecheck_frames_rejected_total", "Frames rejected before the age model (no_face, quality).", ["reason"])
+DETECTOR_RUNS = Counter(
+    "agecheck_detector_runs_total", "Full face detector passes (the tracker covers the other frames).")
+PREDICTIONS = Counter(
+    "agecheck_predictions_total", "Faces scored by the age model.")
+ESCALATIONS = Counter(
+    "agecheck_cascade_escalations_total", "Faces the cheap age model passed on to VGG16.")
+ERRORS = Counter(
+    "agecheck_errors_total", "Frames where detection or prediction raised an error.")
+OUTCOMES = Counter(
+    "agecheck_outcomes_total", "Age checks by outcome (pass, fail, undecided, cancelled, unavailable).", ["outcome"])
+DECISION_SECONDS = Histogram(
+    "agecheck_decision_seconds", "Time from pressing the AI button to the decision.", buckets=LATENCY_BUCKETS)
+FACE_DECISION_SECONDS = Histogram(
+    "agecheck_face_decision_seconds", "Time from the first face in view to the decision.", buckets=LATENCY_BUCKETS)
+FRAME_LATENCY = Histogram(
+    "agecheck_frame_latency_seconds", "Analysis time of one camera frame.", buckets=LATENCY_BUCKETS)
+ANALYSIS_INTERVAL = Gauge(
+    "agecheck_analysis_interval_seconds", "Seconds between analysed frames chosen by the rate governor.")
+CPU_PERCENT = Gauge(
+    "agecheck_process_cpu_percent", "CPU usage of the kiosk process (100 = one core).")
+CAPTURE_FPS = Gauge(
+    "agecheck_capture_fps", "Camera capture rate during the last check.")
+CAPTURE_DROPPED = Counter(
+    "agecheck_capture_dropped_frames_total", "Captured frames replaced before anyone used them.")
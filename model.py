@@ -1,39 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+import numpy as np
 import torch
 from torchvision import models, transforms
 from PIL import Image
 import torch.nn as nn
 import cv2
-from ultralytics import YOLO
+from face_detection import DETECTOR, YoloDetector, box_area, make_detector, rank_detections
+from metrics import ESCALATIONS, PREDICTIONS, STAGE_SECONDS
 
 # ==== CONFIG ====
+AGE_MODEL_PATH = "./epoch_008.pth"  # fine-tuned VGG16 age checkpoint
 YOLO_MODEL_PATH = "yolov8n-face.pt"  # YOLO face detector
+BACKEND = os.environ.get("AGE_BACKEND", "auto")  # "eager", "torchscript", "onnx", "int8" or "auto"
+EXPORT_DIR = "./exported"  # artifacts written by export_models.py
+PARITY_TOLERANCE = 0.5  # max difference in predicted age (years) between backends
 OUTPUT_SIZE = 224
 PADDING_RATIO = 0.0
+NUM_AGES = 101
+MULTI_FRAME_COUNT = 5  # sharp face crops per batched estimate
+MULTI_FRAME_WINDOW = 2.0  # seconds the crops may span
+AGGREGATE_METHOD = "median"  # or "trimmed_mean"
+TRIM_RATIO = 0.2
+CASCADE_MODEL_PATH = "./age_mobilenet.pth"  # MobileNetV3-Small with the same 101-bin age head
+CASCADE = os.environ.get("AGE_CASCADE", "off")  # "on", "off", or "auto": on when the checkpoint exists
+CASCADE_BAND = (0.05, 0.95)  # cheap P(age >= threshold) inside this band escalates to VGG16
 # =================
 
 # ------------------------- Load Age Model -------------------------
 def load_age_model(weights_path, device):
     """Load VGG16-based age prediction model."""
-    model = models.vgg16(weights=models.VGG16_Weights.IMAGENET1K_V1)
-    model.classifier[6] = nn.Linear(4096, 101)
-    nn.init.xavier_normal_(model.classifier[6].weight)
-    nn.init.zeros_(model.classifier[6].bias)
+    # Build on the meta device: no ImageNet download and no random init,
+    # every parameter comes straight from the checkpoint below.
+    with torch.device("meta"):
+        model = models.vgg16(weights=None)
+        model.classifier[6] = nn.Linear(4096, NUM_AGES)
 
-    checkpoint = torch.load(weights_path, map_location=device)
+    # mmap keeps the checkpoint on disk until pages are touched, so only
+    # one copy of the weights is ever resident.
+    checkpoint = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
     if 'model_state_dict' in checkpoint:
         state_dict = checkpoint['model_state_dict']
     else:
         state_dict = checkpoint
 
-    model.load_state_dict(state_dict)
+    model.load_state_dict(state_dict, assign=True)
     model.to(device)
     model.eval()
     return model
 
+def load_cheap_age_model(weights_path, device):
+    """Load the MobileNetV3-Small age model of the cascade, the same way as the VGG16 one."""
+    with torch.device("meta"):
+        model = models.mobilenet_v3_small(weights=None)
+        model.classifier[3] = nn.Linear(model.classifier[3].in_features, NUM_AGES)
+
+    checkpoint = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+    model.load_state_dict(checkpoint.get('model_state_dict', checkpoint), assign=True)
+    model.to(device)
+    model.eval()
+    return model
+
+class CascadeAgeModel:
+    """
+    Two-tier age model, called like the eager one: the cheap model scores
+    every face and only faces whose P(age >= threshold) falls inside `band`
+    go on to the expensive model. Obvious adults and obvious teenagers never
+    pay for VGG16; close calls get exactly the VGG16 answer. The threshold
+    is the check's min_age, passed per call; without one every face is a
+    close call.
+    """
+    def __init__(self, cheap, expensive, band=CASCADE_BAND):
+        self.cheap = cheap
+        self.expensive = expensive
+        self.band = band
+        self.scored = 0
+        self.escalated = 0
+
+    def eval(self):
+        self.cheap.eval()
+        self.expensive.eval()
+        return self
+
+    @property
+    def escalation_rate(self):
+        return self.escalated / self.scored if self.scored else 0.0
+
+    def __call__(self, batch, threshold=None):
+        self.scored += len(batch)
+        if threshold is None:
+            self.escalated += len(batch)
+            ESCALATIONS.inc(len(batch))
+            return self.expensive(batch)
+        logits = self.cheap(batch)
+        p_over = torch.softmax(logits, dim=1)[:, threshold:].sum(dim=1)
+        uncertain = (p_over > self.band[0]) & (p_over < self.band[1])
+        if uncertain.any():
+            self.escalated += int(uncertain.sum())
+            ESCALATIONS.inc(int(uncertain.sum()))
+            logits = logits.clone()
+            logits[uncertain] = self.expensive(batch[uncertain]).to(logits.device, logits.dtype)
+        return logits
+
+def cascade_enabled(cascade, path=CASCADE_MODEL_PATH):
+    if cascade == "auto":
+        return os.path.exists(path)
+    return cascade == "on"
+
+# ------------------------- Inference Backends -------------------------
+def exported_path(source_path, backend):
+    """Where export_models.py puts the `backend` artifact for a .pt/.pth file."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    suffix = {"torchscript": ".torchscript", "onnx": ".onnx", "int8": ".int8.torchscript"}[backend]
+    return os.path.join(EXPORT_DIR, stem + suffix)
+
+class TorchScriptAgeModel:
+    """Frozen TorchScript export of the age model, called like the eager one."""
+    def __init__(self, path, device, channels_last=False):
+        self.module = torch.jit.load(path, map_location=device)
+        self.module.eval()
+        self.device = device
+        self.channels_last = channels_last
+
+    def eval(self):
+        return self
+
+    def __call__(self, batch):
+        batch = batch.to(self.device)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        return self.module(batch)
+
+class OnnxAgeModel:
+    """ONNX Runtime session for the age model, called like the eager one."""
+    def __init__(self, path):
+        import onnxruntime as ort  # optional dependency, only needed for this backend
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def eval(self):
+        return self
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.cpu().numpy()})[0]
+        return torch.from_numpy(logits).to(batch.device)
+
+def file_digest(path):
+    """SHA-256 of a file, e.g. to tell a replaced checkpoint from the exported one."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parity_marker_path(artifact):
+    return artifact + ".parity.json"
+
+def write_parity_marker(artifact, weights_path, max_diff, faces):
+    """Record that `artifact` passed the parity check against this checkpoint on `faces` face crops."""
+    with open(parity_marker_path(artifact), "w") as f:
+        json.dump({"weights": os.path.basename(weights_path), "sha256": file_digest(weights_path),
+                   "max_age_difference": max_diff, "faces": faces}, f, indent=2)
+
+def export_verified(artifact, weights_digest):
+    """True when `artifact` passed parity on real faces against the checkpoint with this digest."""
+    try:
+        with open(parity_marker_path(artifact)) as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return marker.get("faces", 0) > 0 and marker.get("sha256") == weights_digest
+
+def resolve_backend(backend, weights_path, device):
+    """
+    Pick a concrete backend; "auto" takes the fastest exported CPU engine
+    whose parity marker matches the current checkpoint (see export_models.py).
+    """
+    if backend != "auto":
+        return backend
+    if device.type != "cpu" or not os.path.exists(weights_path):
+        return "eager"
+    candidates = []
+    try:
+        import onnxruntime  # noqa: F401
+        candidates.append("onnx")
+    except ImportError:
+        pass
+    candidates.append("torchscript")
+    digest = None
+    for candidate in candidates:
+        path = exported_path(weights_path, candidate)
+        if not os.path.exists(path):
+            continue
+        digest = digest or file_digest(weights_path)
+        if export_verified(path, digest):
+            return candidate
+        print(f"Ignoring {path}: not verified against the current {os.path.basename(weights_path)}")
+    return "eager"
+
+def load_age_backend(backend, weights_path, device):
+    """Load the age model for an "eager", "torchscript", "onnx" or "int8" backend."""
+    if backend == "eager":
+        return load_age_model(weights_path, device)
+    if backend == "torchscript":
+        return TorchScriptAgeModel(exported_path(weights_path, "torchscript"), device)
+    if backend == "onnx":
+        return OnnxAgeModel(exported_path(weights_path, "onnx"))
+    if backend == "int8":
+        # written by quantize_model.py; CPU only, never picked by "auto"
+        return TorchScriptAgeModel(exported_path(weights_path, "int8"), torch.device("cpu"), channels_last=True)
+    raise ValueError(f"Unknown backend: {backend}")
+
+def face_detector_path(backend, yolo_model_path):
+    """The YOLO weights matching a backend; ultralytics loads all three formats."""
+    if backend in ("eager", "int8"):
+        return yolo_model_path
+    path = exported_path(yolo_model_path, backend)
+    return path if os.path.exists(path) else yolo_model_path
+
+def check_parity(reference, candidate, batch, tolerance=PARITY_TOLERANCE):
+    """
+    Compare expected ages of two age models on the same preprocessed batch.
+    Returns (ok, max_difference_in_years).
+    """
+    ages = torch.arange(NUM_AGES, dtype=torch.float32)
+    with torch.no_grad():
+        ref = torch.softmax(reference(batch), dim=1).cpu() @ ages
+        cand = torch.softmax(candidate(batch), dim=1).cpu() @ ages
+    max_diff = float((ref - cand).abs().max())
+    return max_diff <= tolerance, max_diff
+
 # ------------------------- Crop & Resize -------------------------
-def crop_and_resize(img, box, size=OUTPUT_SIZE, pad_ratio=PADDING_RATIO):
-    """Crop, pad, and resize a face from a NumPy image."""
-    h_img, w_img = img.shape[:2]
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+def square_box(img_shape, box, pad_ratio=PADDING_RATIO):
+    """Pad a face box and grow it to a square, clipped to the image."""
+    h_img, w_img = img_shape[:2]
     x1, y1, x2, y2 = box
     w, h = x2 - x1, y2 - y1
     pad_w, pad_h = pad_ratio * w, pad_ratio * h
@@ -45,70 +254,363 @@ def crop_and_resize(img, box, size=OUTPUT_SIZE, pad_ratio=PADDING_RATIO):
     half_size = max(x2 - x1, y2 - y1) / 2
     x1, x2 = int(max(0, cx - half_size)), int(min(w_img, cx + half_size))
     y1, y2 = int(max(0, cy - half_size)), int(min(h_img, cy + half_size))
+    return x1, y1, x2, y2
 
+def crop_and_resize(img, box, size=OUTPUT_SIZE, pad_ratio=PADDING_RATIO):
+    """Crop, pad, and resize a face from a NumPy image."""
+    x1, y1, x2, y2 = square_box(img.shape, box, pad_ratio)
     crop = img[y1:y2, x1:x2]
     crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
     crop = cv2.rotate(crop, cv2.ROTATE_180)
     resized = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
     return Image.fromarray(resized)
 
+def face_crops(frame, boxes, size=OUTPUT_SIZE, pad_ratio=PADDING_RATIO):
+    """
+    The square, resized BGR crops FacePreprocessor.write takes from a frame,
+    as an [N, size, size, 3] uint8 array. Pass them back through write()
+    with the full crop as box to finish the preprocessing.
+    """
+    crops = np.empty((len(boxes), size, size, 3), dtype=np.uint8)
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = square_box(frame.shape, box, pad_ratio)
+        cv2.resize(frame[y1:y2, x1:x2], (size, size), dst=crops[i], interpolation=cv2.INTER_AREA)
+    return crops
+
+class FacePreprocessor:
+    """
+    Fused crop -> resize -> rotate -> RGB -> normalize, from a BGR frame
+    straight into a reused (pinned on CUDA) float tensor. Matches
+    crop_and_resize + PREPROCESS without disk I/O or a PIL round trip.
+    Not thread-safe: give every worker thread its own instance.
+    """
+    def __init__(self, device, size=OUTPUT_SIZE, max_batch=8, pad_ratio=PADDING_RATIO):
+        self.device = device
+        self.size = size
+        self.pad_ratio = pad_ratio
+        self._resized = np.empty((size, size, 3), dtype=np.uint8)
+        self._rotated = np.empty((size, size, 3), dtype=np.uint8)
+        self._resized_t = torch.from_numpy(self._resized).permute(2, 0, 1)  # view, no copy
+        # (x / 255 - mean) / std == x * scale - shift
+        std = torch.tensor(STD).view(1, 3, 1, 1)
+        self._scale = 1.0 / (255.0 * std)
+        self._shift = torch.tensor(MEAN).view(1, 3, 1, 1) / std
+        self._batch = self.new_batch(max_batch)
+
+    def new_batch(self, n):
+        return torch.empty((n, 3, self.size, self.size), dtype=torch.float32,
+                           pin_memory=self.device.type == "cuda")
+
+    def write(self, frame, box, out):
+        """Write one normalized face crop into `out`, a [3, size, size] float tensor."""
+        x1, y1, x2, y2 = square_box(frame.shape, box, self.pad_ratio)
+        # resizing first keeps the rotate and colour swap on the small crop;
+        # area resampling is symmetric, so the order does not change the pixels
+        cv2.resize(frame[y1:y2, x1:x2], (self.size, self.size), dst=self._resized,
+                   interpolation=cv2.INTER_AREA)
+        cv2.rotate(self._resized, cv2.ROTATE_180, dst=self._rotated)
+        cv2.cvtColor(self._rotated, cv2.COLOR_BGR2RGB, dst=self._resized)
+        out.copy_(self._resized_t)
+        out.mul_(self._scale[0]).sub_(self._shift[0])
+        return out
+
+    def __call__(self, frame, boxes):
+        """
+        Normalized [N, 3, size, size] batch for N boxes, on the target device.
+        The result aliases an internal buffer that the next call overwrites.
+        """
+        with STAGE_SECONDS.labels("preprocess").time():
+            if len(boxes) > len(self._batch):
+                self._batch = self.new_batch(len(boxes))
+            batch = self._batch[:len(boxes)]
+            for i, box in enumerate(boxes):
+                self.write(frame, box, batch[i])
+            return batch.to(self.device, non_blocking=True)
+
+    def from_crops(self, crops):
+        """The same batch for crops already cut and resized by face_crops."""
+        with STAGE_SECONDS.labels("preprocess").time():
+            if len(crops) > len(self._batch):
+                self._batch = self.new_batch(len(crops))
+            batch = self._batch[:len(crops)]
+            for i, crop in enumerate(crops):
+                self.write(crop, (0, 0, crop.shape[1], crop.shape[0]), batch[i])
+            return batch.to(self.device, non_blocking=True)
+
 # ------------------------- Prepare Face -------------------------
 class FacePreparer:
     """Detects and crops faces from frames using YOLO."""
     def __init__(self, yolo_model_path=YOLO_MODEL_PATH):
-        self.yolo = YOLO(yolo_model_path)
+        from ultralytics import YOLO  # slow import, only paid when a detector is built
+        self.yolo = YOLO(yolo_model_path, task="detect")
+        self.detector = YoloDetector(self.yolo)
+
+    def detect(self, frame):
+        """All YOLO detections in the frame."""
+        return self.detector.detect(frame)
 
-    def from_frame(self, frame):
-        """Return a PIL Image of the first detected face."""
-        results = self.yolo(frame)
-        boxes = results[0].boxes.xyxy
-        if len(boxes) == 0:
+    def faces(self, frame, detections=None):
+        """
+        All detected faces, ranked by size, centrality and confidence. Pass
+        the detections of an earlier detector to skip running YOLO again.
+        """
+        if detections is None:
+            detections = self.detect(frame)
+        if len(detections) == 0:
             raise ValueError("No face detected in the frame.")
-        x1, y1, x2, y2 = boxes[0].tolist()
-        return crop_and_resize(frame, (x1, y1, x2, y2))
+        return rank_detections(detections, frame.shape)
+
+    def first_box(self, frame, detections=None):
+        """Box of the best-ranked face."""
+        return self.faces(frame, detections)[0].box
+
+    def from_frame(self, frame, detections=None):
+        """Return a PIL Image of the best-ranked face."""
+        return crop_and_resize(frame, self.first_box(frame, detections))
 
 # ------------------------- Predict Age -------------------------
-def predict_age_from_frame(model, frame, device, face_preparer=None):
+PREPROCESS = transforms.Compose([
+    transforms.ToTensor(),
+    transforms.Normalize(mean=MEAN, std=STD)
+])
+
+def age_distributions(model, batch, min_age=None):
+    """
+    Softmax over the age bins for a preprocessed batch, as an [N, num_ages]
+    array. min_age, the age the check is for, lets a cascade skip VGG16 on
+    faces far from it.
+    """
+    model.eval()
+    with STAGE_SECONDS.labels("forward").time(), torch.no_grad():
+        logits = model(batch, min_age) if isinstance(model, CascadeAgeModel) else model(batch)
+        probs = torch.softmax(logits, dim=1).cpu().numpy()  # shape [N, num_ages]
+    PREDICTIONS.inc(len(probs))
+    return probs
+
+def expected_ages(probs):
+    """Expected age of each row of age-bin probabilities."""
+    return probs @ np.arange(probs.shape[1], dtype=np.float32)
+
+def predict_age_from_frame(model, frame, device, face_preparer=None, detections=None, preprocessor=None):
     """
     Predict age from an OpenCV frame (NumPy array).
     - model: age prediction model
     - frame: BGR image
     - device: torch.device
     - face_preparer: optional FacePreparer instance
+    - detections: optional face detections already found in the frame
+    - preprocessor: optional FacePreprocessor whose buffers are reused
     """
     if face_preparer is None:
         face_preparer = FacePreparer()
+    if preprocessor is None:
+        preprocessor = FacePreprocessor(device, max_batch=1)
 
-    # Detect and crop face
-    face = face_preparer.from_frame(frame)
+    box = face_preparer.first_box(frame, detections)
+    probs = age_distributions(model, preprocessor(frame, [box]))
+    return float(expected_ages(probs)[0])
 
-    face.save('gezicht.png')
-    
+# ------------------------- Multiple Faces -------------------------
+# one scored face: its Detection box and score, expected age and age-bin probabilities
+FaceAge = namedtuple("FaceAge", ["box", "score", "age", "probs"])
 
-    # Preprocess for VGG16
-    preprocess = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                             std=[0.229, 0.224, 0.225])
-    ])
-    img_tensor = preprocess(face).unsqueeze(0).to(device)
+def predict_faces_from_frame(model, frame, device, face_preparer, detections=None, preprocessor=None,
+                             min_age=None):
+    """Score every ranked face in the frame with one batched forward pass, best-ranked first."""
+    if preprocessor is None:
+        preprocessor = FacePreprocessor(device)
+    faces = face_preparer.faces(frame, detections)
+    probs = age_distributions(model, preprocessor(frame, [face.box for face in faces]), min_age)
+    return [
+        FaceAge(face.box, face.score, float(age), p)
+        for face, age, p in zip(faces, expected_ages(probs), probs)
+    ]
 
-    # Predict age
-    model.eval()
-    with torch.no_grad():
-        output = model(img_tensor)  # logits of shape [1, num_ages]
-        probs = torch.softmax(output, dim=1)  # shape [1, num_ages]
-        ages = torch.arange(probs.size(1), dtype=torch.float32).to(probs.device)
-        predicted_age = torch.sum(probs * ages, dim=1).item()
-    return predicted_age
-
-# ------------------------- Initialize -------------------------
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = load_age_model("./epoch_008.pth", device)
-face_preparer = FacePreparer()
-
-def predict_age(frame):
+def select_face(faces, policy):
+    """Pick one FaceAge: "ranked" (best-ranked), "largest" or "youngest"."""
+    if policy == "ranked":
+        return faces[0]
+    if policy == "largest":
+        return max(faces, key=lambda face: box_area(face.box))
+    if policy == "youngest":
+        return min(faces, key=lambda face: face.age)
+    raise ValueError(f"Unknown face policy: {policy}")
+
+# ------------------------- Multi-Frame Estimation -------------------------
+AgeEstimate = namedtuple("AgeEstimate", ["age", "spread", "count"])
+
+def predict_age_distributions(model, faces, device):
+    """Softmax over the age bins for each PIL face crop, as an [N, num_ages] array."""
+    return age_distributions(model, torch.stack([PREPROCESS(face) for face in faces]).to(device))
+
+def predict_ages(model, faces, device):
+    """Predict the expected age of each PIL face crop in one batched forward pass."""
+    return expected_ages(predict_age_distributions(model, faces, device)).tolist()
+
+def aggregate_ages(ages, method=AGGREGATE_METHOD, trim_ratio=TRIM_RATIO):
+    """
+    Combine per-frame ages into one robust AgeEstimate.
+    - median: spread is the scaled median absolute deviation
+    - trimmed_mean: drops trim_ratio of the ages at each end, spread is their std
+    """
+    ages = np.sort(np.asarray(ages, dtype=np.float32))
+    if method == "median":
+        age = float(np.median(ages))
+        spread = float(1.4826 * np.median(np.abs(ages - age)))
+    elif method == "trimmed_mean":
+        cut = int(len(ages) * trim_ratio)
+        kept = ages[cut:len(ages) - cut]
+        age, spread = float(kept.mean()), float(kept.std())
+    else:
+        raise ValueError(f"Unknown aggregation method: {method}")
+    return AgeEstimate(age, spread, len(ages))
+
+class MultiFrameAgeEstimator:
+    """
+    Collects face crops over a short window and scores them as one batch.
+    `policy` (see select_face) picks the face per frame; "youngest" costs an
+    extra batched forward on frames with more than one face.
+    """
+    def __init__(self, model, device, face_preparer, count=MULTI_FRAME_COUNT,
+                 window=MULTI_FRAME_WINDOW, method=AGGREGATE_METHOD, policy="ranked", min_age=None):
+        self.model = model
+        self.device = device
+        self.face_preparer = face_preparer
+        self.count = count
+        self.window = window
+        self.method = method
+        self.policy = policy
+        self.min_age = min_age
+        # crops are written straight into a ring of `count` preprocessed slots
+        self.preprocessor = FacePreprocessor(device, max_batch=1)
+        self.batch = self.preprocessor.new_batch(count)
+        self.crops = deque()  # timestamps of the crops in the ring, oldest first
+        self._next_slot = 0
+
+    def add(self, frame, timestamp=None, detections=None):
+        """Add a frame; returns an AgeEstimate once `count` crops fall inside the window."""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        try:
+            box = self.select_box(frame, detections)
+        except ValueError:
+            return None
+
+        # at most count - 1 crops are waiting, so this slot is free
+        self.preprocessor.write(frame, box, self.batch[self._next_slot])
+        self._next_slot = (self._next_slot + 1) % self.count
+        self.crops.append(timestamp)
+        while timestamp - self.crops[0] > self.window:
+            self.crops.popleft()
+        if len(self.crops) < self.count:
+            return None
+
+        self.crops.clear()
+        probs = age_distributions(self.model, self.batch.to(self.device, non_blocking=True), self.min_age)
+        return aggregate_ages(expected_ages(probs), self.method)
+
+    def select_box(self, frame, detections=None):
+        """Box of the face the policy picks in this frame."""
+        faces = self.face_preparer.faces(frame, detections)
+        if len(faces) > 1 and self.policy == "youngest":
+            faces = predict_faces_from_frame(self.model, frame, self.device, self.face_preparer,
+                                             detections, self.preprocessor, self.min_age)
+        return select_face(faces, self.policy).box
+
+# ------------------------- Model Registry -------------------------
+class ModelRegistry:
+    """
+    Builds the age model and face detector once, on first use or in the
+    background, and warms both up with a dummy forward pass.
+    """
+    def __init__(self, weights_path=AGE_MODEL_PATH, yolo_model_path=YOLO_MODEL_PATH, backend=BACKEND,
+                 cascade=CASCADE):
+        self.weights_path = weights_path
+        self.yolo_model_path = yolo_model_path
+        self.backend = backend
+        self.cascade = cascade
+        self.device = None
+        self.model = None
+        self.face_preparer = None
+        self.preprocessor = None  # used by the camera's inference worker only
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def load(self):
+        """Load and warm up the models, blocking until they are usable."""
+        with self._lock:
+            if not self.ready:
+                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                self.backend = resolve_backend(self.backend, self.weights_path, self.device)
+                self.model = load_age_backend(self.backend, self.weights_path, self.device)
+                if cascade_enabled(self.cascade):
+                    cheap = load_cheap_age_model(CASCADE_MODEL_PATH, self.device)
+                    self.model = CascadeAgeModel(cheap, self.model)
+                    print("Age model cascade: MobileNetV3-Small, VGG16 on close calls")
+                self.face_preparer = FacePreparer(face_detector_path(self.backend, self.yolo_model_path))
+                self.preprocessor = FacePreprocessor(self.device)
+                print("Age model backend:", self.backend)
+                self._warm_up()
+                self._ready.set()
+        return self
+
+    def load_async(self, on_ready=None, on_error=None):
+        """Load on a background thread; callbacks run on that thread."""
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                print("Model loading error:", e)
+                if on_error:
+                    on_error(e)
+                return
+            if on_ready:
+                on_ready()
+
+        thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self):
+        """Run each network once so the first real prediction is not slow."""
+        self.face_preparer.yolo(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False)
+        dummy = torch.zeros(1, 3, OUTPUT_SIZE, OUTPUT_SIZE, device=self.device)
+        with torch.no_grad():
+            if isinstance(self.model, CascadeAgeModel):
+                self.model.cheap(dummy)
+                self.model.expensive(dummy)
+            else:
+                self.model(dummy)
+
+
+model_registry = ModelRegistry()
+
+def predict_age(frame, detections=None):
     """Convenience function for KivyCamera frames."""
-    return predict_age_from_frame(model, frame, device, face_preparer)
+    registry = model_registry.load()
+    return predict_age_from_frame(registry.model, frame, registry.device, registry.face_preparer,
+                                  detections, registry.preprocessor)
+
+def predict_age_distribution(frame, detections=None):
+    """Age-bin probabilities for the face in a KivyCamera frame."""
+    registry = model_registry.load()
+    box = registry.face_preparer.first_box(frame, detections)
+    return age_distributions(registry.model, registry.preprocessor(frame, [box]))[0]
+
+def predict_faces(frame, detections=None, min_age=None):
+    """Per-face ages and boxes for a KivyCamera frame, best-ranked first."""
+    registry = model_registry.load()
+    return predict_faces_from_frame(registry.model, frame, registry.device, registry.face_preparer,
+                                    detections, registry.preprocessor, min_age)
 
+def new_face_detector(kind=DETECTOR):
+    """Face detector sharing the registry's YOLO model."""
+    return make_detector(kind, model_registry.load().face_preparer.yolo)
 
+def new_multi_frame_estimator(**kwargs):
+    """MultiFrameAgeEstimator bound to the shared models."""
+    registry = model_registry.load()
+    return MultiFrameAgeEstimator(registry.model, registry.device, registry.face_preparer, **kwargs)
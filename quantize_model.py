@@ -0,0 +1,185 @@
+"""
+Build an int8 version of the VGG16 age model for CPU kiosks and report how
+it compares with the fp32 model.
+
+- convolutions: static int8, calibrated on a folder of local face crops
+- Linear layers (the ~120M parameter classifier head): dynamic int8
+- channels_last memory format throughout
+
+    python quantize_model.py --calib ./face_crops
+    python quantize_model.py --calib ./face_crops --eval ./face_crops_test --report int8_report.json
+
+Face crops are images as fed to the age model (see crop_and_resize). When a
+file name starts with the age, e.g. "34_0_1_2017.jpg", the report also
+includes the error against that label.
+"""
+import argparse
+import copy
+import glob
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from torch.ao.quantization import DeQuantStub, QuantStub, convert, fuse_modules, get_default_qconfig, prepare, quantize_dynamic
+from model import AGE_MODEL_PATH, EXPORT_DIR, NUM_AGES, OUTPUT_SIZE, PREPROCESS, exported_path, load_age_backend, load_age_model
+
+LATENCY_RUNS = 20
+
+
+# ---------------- Quantizable Model ----------------
+class QuantizableVGGAge(nn.Module):
+    """VGG16 age model with quant/dequant stubs around the convolutional features."""
+    def __init__(self, vgg):
+        super().__init__()
+        self.quant = QuantStub()
+        self.features = vgg.features
+        self.dequant = DeQuantStub()
+        self.avgpool = vgg.avgpool
+        self.classifier = vgg.classifier
+
+    def forward(self, x):
+        x = x.contiguous(memory_format=torch.channels_last)
+        x = self.dequant(self.features(self.quant(x)))
+        x = torch.flatten(self.avgpool(x), 1)
+        return self.classifier(x)
+
+def conv_relu_pairs(features):
+    """Names of each Conv2d + ReLU pair in a Sequential, for fusing."""
+    layers = list(features)
+    return [
+        [str(i), str(i + 1)]
+        for i in range(len(layers) - 1)
+        if isinstance(layers[i], nn.Conv2d) and isinstance(layers[i + 1], nn.ReLU)
+    ]
+
+def quantize_age_model(fp32_model, calibration_batches):
+    """Static int8 convs, dynamic int8 Linear layers, channels_last."""
+    model = QuantizableVGGAge(copy.deepcopy(fp32_model)).eval()
+    fuse_modules(model.features, conv_relu_pairs(model.features), inplace=True)
+
+    qconfig = get_default_qconfig("x86")
+    for stage in (model.quant, model.features, model.dequant):
+        stage.qconfig = qconfig
+    model = model.to(memory_format=torch.channels_last)
+    prepare(model, inplace=True)
+    with torch.no_grad():
+        for batch in calibration_batches:
+            model(batch)
+    convert(model, inplace=True)
+
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def save_torchscript(model, path):
+    example = torch.zeros(1, 3, OUTPUT_SIZE, OUTPUT_SIZE)
+    with torch.no_grad():
+        torch.jit.freeze(torch.jit.trace(model, example)).save(path)
+
+
+# ---------------- Face Crops ----------------
+def load_face_crops(folder):
+    """Preprocessed face crops and their file-name age labels (None if absent)."""
+    tensors, labels = [], []
+    for path in sorted(glob.glob(os.path.join(folder, "*"))):
+        try:
+            face = Image.open(path).convert("RGB").resize((OUTPUT_SIZE, OUTPUT_SIZE))
+        except OSError:
+            continue
+        tensors.append(PREPROCESS(face))
+        prefix = os.path.basename(path).split("_")[0]
+        labels.append(int(prefix) if prefix.isdigit() else None)
+    if not tensors:
+        raise SystemExit(f"No images found in {folder}")
+    return torch.stack(tensors), labels
+
+def batches(tensor, size):
+    return [tensor[i:i + size] for i in range(0, len(tensor), size)]
+
+
+# ---------------- Report ----------------
+def expected_ages(model, crops, batch_size):
+    ages = torch.arange(NUM_AGES, dtype=torch.float32)
+    with torch.no_grad():
+        return torch.cat([torch.softmax(model(b), dim=1) @ ages for b in batches(crops, batch_size)]).numpy()
+
+def latency_ms(model, runs=LATENCY_RUNS):
+    """Median single-face forward time."""
+    x = torch.rand(1, 3, OUTPUT_SIZE, OUTPUT_SIZE)
+    times = []
+    with torch.no_grad():
+        model(x)
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(x)
+            times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+def _rss_child(backend, weights_path, queue):
+    import psutil
+    model = load_age_backend(backend, weights_path, torch.device("cpu"))
+    with torch.no_grad():
+        model(torch.rand(1, 3, OUTPUT_SIZE, OUTPUT_SIZE))
+    queue.put(psutil.Process().memory_info().rss)
+
+def resident_mb(backend, weights_path):
+    """Resident memory of a fresh process that loaded the backend and ran one forward."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    child = ctx.Process(target=_rss_child, args=(backend, weights_path, queue))
+    child.start()
+    rss = queue.get()
+    child.join()
+    return rss / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=AGE_MODEL_PATH, help="fp32 age model checkpoint")
+    parser.add_argument("--calib", required=True, help="folder of face crops for calibration")
+    parser.add_argument("--eval", help="folder of face crops for the report (default: --calib)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--report", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    torch.backends.quantized.engine = "x86"
+    device = torch.device("cpu")
+    fp32 = load_age_model(args.weights, device)
+
+    calib, _ = load_face_crops(args.calib)
+    int8 = quantize_age_model(fp32, batches(calib, args.batch_size))
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = exported_path(args.weights, "int8")
+    save_torchscript(int8, path)
+    print("int8 model ->", path)
+
+    crops, labels = load_face_crops(args.eval) if args.eval else load_face_crops(args.calib)
+    int8 = load_age_backend("int8", args.weights, device)
+    fp32_ages = expected_ages(fp32, crops, args.batch_size)
+    int8_ages = expected_ages(int8, crops, args.batch_size)
+
+    report = {
+        "faces": len(crops),
+        "fp32": {"latency_ms": latency_ms(fp32), "resident_mb": resident_mb("eager", args.weights)},
+        "int8": {"latency_ms": latency_ms(int8), "resident_mb": resident_mb("int8", args.weights)},
+        "int8_vs_fp32_mae": float(np.abs(int8_ages - fp32_ages).mean()),
+        "int8_vs_fp32_max_error": float(np.abs(int8_ages - fp32_ages).max()),
+    }
+    labelled = [i for i, label in enumerate(labels) if label is not None]
+    if labelled:
+        truth = np.array([labels[i] for i in labelled], dtype=np.float32)
+        report["fp32"]["label_mae"] = float(np.abs(fp32_ages[labelled] - truth).mean())
+        report["int8"]["label_mae"] = float(np.abs(int8_ages[labelled] - truth).mean())
+
+    for name in ("fp32", "int8"):
+        print(f"{name}: " + ", ".join(f"{k} {v:.2f}" for k, v in report[name].items()))
+    print(f"int8 vs fp32: MAE {report['int8_vs_fp32_mae']:.2f} years, max {report['int8_vs_fp32_max_error']:.2f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import time
+from metrics import ANALYSIS_INTERVAL, CPU_PERCENT, FACE_DECISION_SECONDS, FRAME_LATENCY
+
+# ==== CONFIG ====
+ACTIVE_FPS = 30  # preview rate while someone is in front of the camera
+IDLE_FPS = 5  # preview and capture rate with nobody in view
+ACTIVE_ANALYSE_FPS = 15  # frames analysed per second with a face present
+IDLE_ANALYSE_FPS = 2  # frames analysed per second to notice someone arriving
+FACE_HOLD = 1.5  # seconds to stay active after the last face
+LATENCY_BUDGET = 0.15  # seconds of analysis per frame before detection backs off
+LATENCY_SMOOTHING = 0.2  # weight of the newest latency in the average
+BACKOFF_STEP = 1.5
+MAX_BACKOFF = 4.0  # analyse at no less than a quarter of the normal rate
+CPU_SAMPLE_INTERVAL = 2.0  # seconds between CPU usage samples
+# =================
+
+
+# ---------------- Rate Governor ----------------
+class RateGovernor:
+    """
+    Decides how fast the kiosk previews, captures and analyses. It starts at
+    full speed, since a check usually starts with the customer in view; with
+    nobody in view for FACE_HOLD everything slows down to IDLE rates and the
+    next face switches back. When the average analysis latency exceeds the
+    budget, the analysis interval grows by BACKOFF_STEP (up to MAX_BACKOFF)
+    and shrinks again once it is back under.
+    """
+    def __init__(self, active_fps=ACTIVE_FPS, idle_fps=IDLE_FPS, budget=LATENCY_BUDGET):
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.budget = budget
+        self.active = True
+        self.face_since = None  # first face of the current episode
+        self.face_seen_at = time.monotonic()
+        self.latency = 0.0  # smoothed seconds per analysed frame
+        self.last_latency = 0.0
+        self.backoff = 1.0
+        self._cpu_sampled_at = 0.0
+        try:
+            import psutil  # optional; without it CPU usage is not reported
+            self._process = psutil.Process()
+            self._process.cpu_percent(None)  # the first call only starts the measurement
+        except ImportError:
+            self._process = None
+
+    @property
+    def preview_fps(self):
+        return self.active_fps if self.active else self.idle_fps
+
+    @property
+    def capture_interval(self):
+        """Minimum seconds between camera reads; 0 reads at the camera's own rate."""
+        return 0.0 if self.active else 1.0 / self.idle_fps
+
+    @property
+    def analyse_interval(self):
+        base = 1.0 / (ACTIVE_ANALYSE_FPS if self.active else IDLE_ANALYSE_FPS)
+        return base * self.backoff
+
+    def delay(self):
+        """Seconds to wait before analysing the next frame."""
+        return max(0.0, self.analyse_interval - self.last_latency)
+
+    def observe(self, face_present, latency, now=None):
+        """Report one analysed frame: whether a face was in it and how long it took."""
+        now = time.monotonic() if now is None else now
+        FRAME_LATENCY.observe(latency)
+        self.last_latency = latency
+        self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+        if face_present:
+            if self.face_since is None:
+                self.face_since = now
+            self.active = True
+            self.face_seen_at = now
+        elif self.active and now - self.face_seen_at > FACE_HOLD:
+            self.active = False
+            self.face_since = None
+
+        if self.latency > self.budget:
+            self.backoff = min(MAX_BACKOFF, self.backoff * BACKOFF_STEP)
+        else:
+            self.backoff = max(1.0, self.backoff / BACKOFF_STEP)
+        ANALYSIS_INTERVAL.set(self.analyse_interval)
+        self._sample_cpu(now)
+
+    def decided(self, now=None):
+        """Record how long the decision took from the moment a face appeared."""
+        now = time.monotonic() if now is None else now
+        if self.face_since is not None:
+            FACE_DECISION_SECONDS.observe(now - self.face_since)
+
+    def _sample_cpu(self, now):
+        if self._process is not None and now - self._cpu_sampled_at >= CPU_SAMPLE_INTERVAL:
+            CPU_PERCENT.set(self._process.cpu_percent(None))
+            self._cpu_sampled_at = now